@@ -0,0 +1 @@
+"""Face detection and age/gender classification helpers for the Age-Detection page."""
@@ -0,0 +1,220 @@
+"""Batch scoring of many photos: folders, zip archives and multi-file uploads.
+
+Images are processed in chunks. Each chunk's files are read and decoded in
+a thread pool (``cv2.imdecode`` releases the GIL), downscaled while decoding
+(see ``preprocess.decode_image``), faces are detected per
+image, and all face crops of the chunk are classified together (see
+``inference.classify_faces``). Results come back one row per face, or one
+row per image without faces, so callers can stream them to CSV or JSON as
+they arrive. Face boxes are reported in original image coordinates.
+
+Folders and archives can also be scored from the command line:
+
+    python -m age_detection.batch photos/ more.zip -o results.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from age_detection.inference import AGE_LIST, GENDER_LIST, classify_faces, crop_faces, detect_faces
+from age_detection.models import ModelRegistry
+from age_detection.preprocess import decode_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+# Images decoded and classified together; bounds decoded pixels held in memory
+CHUNK_SIZE = 32
+
+RESULT_FIELDS = ('file', 'face', 'x1', 'y1', 'x2', 'y2', 'face_confidence',
+                 'gender', 'gender_confidence', 'age', 'age_confidence', 'error')
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+class ImageSource:
+    """A named image whose bytes are read only when ``read()`` is called"""
+
+    __slots__ = ('name', 'read')
+
+    def __init__(self, name, read):
+        self.name = name
+        self.read = read
+
+
+def _zip_sources(file, prefix):
+    """ImageSources for the images in a zip archive; members are read before it is closed"""
+    sources = []
+    try:
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                name = f'{prefix}/{info.filename}'
+                try:
+                    data = archive.read(info)
+                except (OSError, zipfile.BadZipFile) as e:
+                    sources.append(ImageSource(name, lambda e=e: _raise(e)))
+                else:
+                    sources.append(ImageSource(name, lambda data=data: data))
+    except zipfile.BadZipFile as e:
+        # Reported as one failed row instead of aborting the whole batch
+        return [ImageSource(prefix, lambda e=e: _raise(e))]
+    return sources
+
+
+def _raise(error):
+    raise error
+
+
+def sources_from_uploads(uploads):
+    """ImageSources for Streamlit uploads, expanding zip archives"""
+    sources = []
+    for upload in uploads:
+        if upload.name.lower().endswith('.zip'):
+            sources.extend(_zip_sources(upload, upload.name))
+        elif is_image_name(upload.name):
+            sources.append(ImageSource(upload.name, upload.getvalue))
+    return sources
+
+
+def sources_from_paths(paths):
+    """ImageSources for image files, directories (recursively) and zip archives"""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    if is_image_name(name) or name.lower().endswith('.zip'):
+                        sources.extend(sources_from_paths([full]))
+        elif path.lower().endswith('.zip'):
+            sources.extend(_zip_sources(path, path))
+        elif is_image_name(path):
+            sources.append(ImageSource(path, lambda path=path: _read_file(path)))
+    return sources
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def decode_source(source):
+    """``(image, scale, error)``: a BGR uint8 image and its downscale factor, or None and the reason"""
+    try:
+        image, scale = decode_image(source.read())
+    except (OSError, zipfile.BadZipFile, KeyError, ValueError) as e:
+        return None, None, str(e)
+    return image, scale, None
+
+
+def score_images(sources, models, conf_threshold=0.7, chunk_size=CHUNK_SIZE, max_workers=None):
+    """Yield ``(images_done, rows)`` after every chunk of ``sources``.
+
+    ``models`` is a ``ModelRegistry``; a network set is borrowed per chunk
+    (after decoding), so a long batch shares the pool with other sessions.
+    """
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for start in range(0, len(sources), chunk_size):
+            chunk = sources[start:start + chunk_size]
+            decoded = list(pool.map(decode_source, chunk))
+
+            rows, crops, owners = [], [], []
+            with models.acquire() as nets:
+                for source, (image, scale, error) in zip(chunk, decoded):
+                    if image is None:
+                        rows.append(_row(source.name, error=error))
+                        continue
+                    boxes, confidences = detect_faces(nets.face, image, conf_threshold)
+                    image_crops, kept = crop_faces(image, boxes)
+                    if not kept:
+                        rows.append(_row(source.name))
+                        continue
+                    for face, i in enumerate(kept, 1):
+                        rows.append(_row(source.name, face, (boxes[i] * scale).round(), confidences[i]))
+                        owners.append(len(rows) - 1)
+                    crops.extend(image_crops)
+
+                # One forward per network for every face in the chunk
+                gender_idx, gender_conf, age_idx, age_conf = classify_faces(nets.age, nets.gender, crops)
+            for row_index, g, gc, a, ac in zip(owners, gender_idx, gender_conf, age_idx, age_conf):
+                rows[row_index].update(gender=GENDER_LIST[g], gender_confidence=round(float(gc), 4),
+                                       age=AGE_LIST[a], age_confidence=round(float(ac), 4))
+            done += len(chunk)
+            yield done, rows
+
+
+def _row(name, face=None, box=None, confidence=None, error=None):
+    row = dict.fromkeys(RESULT_FIELDS)
+    row.update(file=name, face=face, error=error)
+    if box is not None:
+        row.update(x1=int(box[0]), y1=int(box[1]), x2=int(box[2]), y2=int(box[3]),
+                   face_confidence=round(float(confidence), 4))
+    return row
+
+
+class ResultWriter:
+    """Accumulates result rows as CSV text and JSON lines while they stream in"""
+
+    def __init__(self):
+        self._csv = io.StringIO()
+        self._writer = csv.DictWriter(self._csv, fieldnames=RESULT_FIELDS)
+        self._writer.writeheader()
+        self._json = []
+        self.rows = 0
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._json.extend(json.dumps(row) for row in rows)
+        self.rows += len(rows)
+
+    def csv(self):
+        return self._csv.getvalue()
+
+    def json(self):
+        return '[\n' + ',\n'.join(self._json) + '\n]\n'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m age_detection.batch',
+        description="Score age and gender for every face in image files, folders and zip archives."
+    )
+    parser.add_argument('paths', nargs='+', help="Images, directories (searched recursively) or .zip files")
+    parser.add_argument('-o', '--output', required=True, help="Results file (.csv or .json)")
+    parser.add_argument('--conf-threshold', type=float, default=0.7)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension not in ('.csv', '.json'):
+        print(f"Unsupported output type '{extension}', expected .csv or .json", file=sys.stderr)
+        return 2
+    sources = sources_from_paths(args.paths)
+    if not sources:
+        print("No images found", file=sys.stderr)
+        return 1
+    writer = ResultWriter()
+    for done, rows in score_images(sources, ModelRegistry(max_instances=1), args.conf_threshold,
+                                   args.chunk_size):
+        writer.write(rows)
+        print(f"{done}/{len(sources)} images", file=sys.stderr)
+    with open(args.output, 'w', newline='') as f:
+        f.write(writer.csv() if extension == '.csv' else writer.json())
+    print(json.dumps({'images': len(sources), 'rows': writer.rows, 'output': args.output}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
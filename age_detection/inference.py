@@ -0,0 +1,144 @@
+"""Face detection and batched age/gender classification on BGR uint8 images.
+
+The face detector (an SSD) runs once per image at a configurable input
+size. For large photos it can also run over a pyramid of overlapping tiles,
+so faces too small to survive a 300x300 downscale are still found;
+overlapping hits are merged with non-maximum suppression. The age and
+gender networks are Caffe classifiers with the same 227x227 input and mean,
+so every face crop of an image (or batch of images) goes into a single
+``cv2.dnn.blobFromImages`` blob. That blob is forwarded once per network.
+"""
+import cv2
+import numpy as np
+
+MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
+FACE_MEAN_VALUES = (104, 117, 123)
+AGE_LIST = ['(0-2)', '(4-6)', '(8-12)', '(15-20)', '(25-32)', '(38-43)', '(48-53)', '(60-100)']
+GENDER_LIST = ['Male', 'Female']
+
+FACE_INPUT_SIZE = (300, 300)
+CLASSIFIER_INPUT_SIZE = (227, 227)
+FACE_PADDING = 20
+# Crops forwarded through the classifiers at once, bounds blob memory
+MAX_FACE_BATCH = 64
+# Pyramid levels only run on images whose longer side exceeds this many pixels
+PYRAMID_MIN_SIDE = 1200
+TILE_OVERLAP = 0.2
+NMS_THRESHOLD = 0.4
+
+
+def _detect(face_net, image, conf_threshold, input_size):
+    height, width = image.shape[:2]
+    blob = cv2.dnn.blobFromImage(image, 1.0, input_size, FACE_MEAN_VALUES, False, False)
+    face_net.setInput(blob)
+    detections = face_net.forward()[0, 0]
+    detections = detections[detections[:, 2] > conf_threshold]
+    boxes = detections[:, 3:7] * np.array([width, height, width, height])
+    return boxes, detections[:, 2].astype(np.float32)
+
+
+def _tiles(height, width, level):
+    """Overlapping (y0, y1, x0, x1) windows of a 2**level x 2**level grid"""
+    n = 2 ** level
+    tile_h, tile_w = height / n, width / n
+    pad_h, pad_w = tile_h * TILE_OVERLAP, tile_w * TILE_OVERLAP
+    for row in range(n):
+        for col in range(n):
+            yield (int(max(0, row * tile_h - pad_h)), int(min(height, (row + 1) * tile_h + pad_h)),
+                   int(max(0, col * tile_w - pad_w)), int(min(width, (col + 1) * tile_w + pad_w)))
+
+
+def detect_faces(face_net, image, conf_threshold=0.7, input_size=FACE_INPUT_SIZE, pyramid_levels=0):
+    """``(boxes, confidences)`` for one BGR image; boxes are int x1, y1, x2, y2 rows.
+
+    ``input_size`` is the detector resolution. With ``pyramid_levels`` > 0,
+    images larger than PYRAMID_MIN_SIDE are also scanned as 2x2, 4x4, ...
+    grids of overlapping tiles.
+    """
+    boxes, confidences = _detect(face_net, image, conf_threshold, input_size)
+    height, width = image.shape[:2]
+    if pyramid_levels and max(height, width) > PYRAMID_MIN_SIDE:
+        all_boxes, all_conf = [boxes], [confidences]
+        for level in range(1, pyramid_levels + 1):
+            for y0, y1, x0, x1 in _tiles(height, width, level):
+                tile_boxes, tile_conf = _detect(face_net, image[y0:y1, x0:x1], conf_threshold, input_size)
+                all_boxes.append(tile_boxes + np.array([x0, y0, x0, y0]))
+                all_conf.append(tile_conf)
+        boxes, confidences = np.concatenate(all_boxes), np.concatenate(all_conf)
+        if len(boxes):
+            xywh = np.column_stack([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]])
+            keep = np.asarray(cv2.dnn.NMSBoxes(xywh.tolist(), confidences.tolist(),
+                                               conf_threshold, NMS_THRESHOLD), dtype=np.intp).ravel()
+            boxes, confidences = boxes[keep], confidences[keep]
+    return boxes.astype(np.int32), confidences
+
+
+def crop_faces(image, boxes, padding=FACE_PADDING):
+    """Padded face crops (views into ``image``); empty crops are skipped.
+
+    Returns ``(crops, kept)`` where ``kept`` indexes the boxes that gave a crop.
+    """
+    height, width = image.shape[:2]
+    crops, kept = [], []
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        crop = image[max(0, y1 - padding):min(y2 + padding, height - 1),
+                     max(0, x1 - padding):min(x2 + padding, width - 1)]
+        if crop.size:
+            crops.append(crop)
+            kept.append(i)
+    return crops, kept
+
+
+def classify_faces(age_net, gender_net, crops, max_batch=MAX_FACE_BATCH):
+    """Age and gender for every crop with one forward pass per network per batch.
+
+    Returns ``(gender_idx, gender_conf, age_idx, age_conf)`` arrays.
+    """
+    if not crops:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, np.empty(0, np.float32), empty, np.empty(0, np.float32)
+
+    gender_preds, age_preds = [], []
+    for start in range(0, len(crops), max_batch):
+        blob = cv2.dnn.blobFromImages(crops[start:start + max_batch], 1.0, CLASSIFIER_INPUT_SIZE,
+                                      MODEL_MEAN_VALUES, swapRB=False)
+        gender_net.setInput(blob)
+        gender_preds.append(gender_net.forward().reshape(len(blob), -1))
+        age_net.setInput(blob)
+        age_preds.append(age_net.forward().reshape(len(blob), -1))
+    gender_preds = np.concatenate(gender_preds)
+    age_preds = np.concatenate(age_preds)
+    gender_idx = gender_preds.argmax(axis=1)
+    age_idx = age_preds.argmax(axis=1)
+    rows = np.arange(len(crops))
+    return gender_idx, gender_preds[rows, gender_idx], age_idx, age_preds[rows, age_idx]
+
+
+def analyze_image(nets, image, conf_threshold=0.7, input_size=FACE_INPUT_SIZE, pyramid_levels=0):
+    """Detect and classify every face of one image in a single batched pass.
+
+    Returns a list of dicts with ``box``, ``confidence``, ``gender`` and
+    ``age``. ``image`` is only read.
+    """
+    boxes, confidences = detect_faces(nets.face, image, conf_threshold, input_size, pyramid_levels)
+    crops, kept = crop_faces(image, boxes)
+    gender_idx, gender_conf, age_idx, age_conf = classify_faces(nets.age, nets.gender, crops)
+    return [
+        {'box': tuple(int(v) for v in boxes[i]), 'confidence': float(confidences[i]),
+         'gender': GENDER_LIST[g], 'gender_confidence': float(gc),
+         'age': AGE_LIST[a], 'age_confidence': float(ac)}
+        for i, g, gc, a, ac in zip(kept, gender_idx, gender_conf, age_idx, age_conf)
+    ]
+
+
+def annotate_faces(image, faces, inplace=False):
+    """Draw face boxes and age labels; copies ``image`` unless ``inplace``"""
+    if not inplace:
+        image = image.copy()
+    thickness = max(1, int(round(image.shape[0] / 150)))
+    for face in faces:
+        x1, y1, x2, y2 = face['box']
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), thickness, 8)
+        cv2.putText(image, face['age'], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                    (0, 255, 255), 2, cv2.LINE_AA)
+    return image
@@ -0,0 +1,183 @@
+"""Process-wide registry for the face, age and gender networks.
+
+Model files are read from disk once per process and kept as bytes. Networks
+are built from those bytes on demand. A ``cv2.dnn.Net`` is not safe to use
+from two threads at once, so each caller borrows a whole set of networks
+from a small pool for the duration of one inference:
+
+    with registry.acquire() as nets:
+        nets.face.setInput(blob)
+
+The pool grows up to ``max_instances`` sets, then callers wait for a free
+one. ``warm_up`` builds the first set and runs one forward pass through each
+network, so the first real request does not pay the load and
+initialization cost.
+
+Every network is built for one DNN backend/target from ``BACKENDS`` (env
+``AGE_DETECTION_BACKEND``). OpenCV's thread pool is global to the process
+and shared by every pooled set, so by default it is left at OpenCV's own
+setting of all cores. ``num_threads`` (env ``AGE_DETECTION_THREADS``) caps
+that pool for the whole process, not per set. Run
+``benchmarks/bench_age_detection.py --backends all --threads sweep`` for
+images/sec per setting.
+"""
+import os
+import queue
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from age_detection.inference import CLASSIFIER_INPUT_SIZE, FACE_INPUT_SIZE
+
+MODEL_DIR = os.environ.get(
+    'AGE_DETECTION_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+)
+
+# name: (framework, weights file, config file)
+MODEL_FILES = {
+    'face': ('tensorflow', 'opencv_face_detector_uint8.pb', 'opencv_face_detector.pbtxt'),
+    'age': ('caffe', 'age_net.caffemodel', 'age_deploy.prototxt'),
+    'gender': ('caffe', 'gender_net.caffemodel', 'gender_deploy.prototxt'),
+}
+
+Nets = namedtuple('Nets', ['face', 'age', 'gender'])
+
+# name: (cv2.dnn backend constant, target constant); constants missing from
+# the installed OpenCV build make the setting unavailable
+BACKENDS = {
+    'default': ('DNN_BACKEND_DEFAULT', 'DNN_TARGET_CPU'),
+    'opencv': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_CPU'),
+    'opencv-fp16': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_CPU_FP16'),
+    'openvino': ('DNN_BACKEND_INFERENCE_ENGINE', 'DNN_TARGET_CPU'),
+    'opencl': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL'),
+    'opencl-fp16': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL_FP16'),
+}
+DEFAULT_BACKEND = os.environ.get('AGE_DETECTION_BACKEND', 'default')
+
+
+def default_max_instances():
+    # Each set runs its own intra-op threads; a few sets cover concurrent sessions
+    return max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def default_num_threads():
+    # None keeps OpenCV's default; setNumThreads would cap every session at once
+    threads = os.environ.get('AGE_DETECTION_THREADS')
+    return int(threads) if threads else None
+
+
+def resolve_backend(name):
+    """``(backend, target)`` cv2.dnn constants for a BACKENDS name.
+
+    Raises ValueError for unknown names and settings this OpenCV build
+    cannot run.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DNN backend {name!r}; choose from {', '.join(BACKENDS)}")
+    backend_name, target_name = BACKENDS[name]
+    backend = getattr(cv2.dnn, backend_name, None)
+    target = getattr(cv2.dnn, target_name, None)
+    if backend is None or target is None:
+        raise ValueError(f"DNN backend {name!r} is not supported by OpenCV {cv2.__version__}")
+    if name != 'default' and target not in cv2.dnn.getAvailableTargets(backend):
+        raise ValueError(f"DNN backend {name!r} is not available in this OpenCV build")
+    return backend, target
+
+
+def available_backends():
+    """BACKENDS names this OpenCV build can run"""
+    names = []
+    for name in BACKENDS:
+        try:
+            resolve_backend(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+class ModelRegistry:
+    """Pool of network sets built from model bytes read once per process"""
+
+    def __init__(self, model_dir=MODEL_DIR, max_instances=None, backend=None, num_threads=None):
+        self.model_dir = model_dir
+        self.max_instances = max_instances or default_max_instances()
+        self.backend = backend or DEFAULT_BACKEND
+        self._backend_target = resolve_backend(self.backend)
+        self.num_threads = num_threads or default_num_threads()
+        self._buffers = None
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+
+    def _read_buffers(self):
+        with self._lock:
+            if self._buffers is None:
+                buffers = {}
+                for name, (framework, weights, config) in MODEL_FILES.items():
+                    buffers[name] = (
+                        framework,
+                        np.fromfile(os.path.join(self.model_dir, weights), dtype=np.uint8),
+                        np.fromfile(os.path.join(self.model_dir, config), dtype=np.uint8),
+                    )
+                self._buffers = buffers
+            return self._buffers
+
+    def _build(self):
+        buffers = self._read_buffers()
+        if self.num_threads:
+            cv2.setNumThreads(self.num_threads)
+        backend, target = self._backend_target
+        nets = {}
+        for name, (framework, weights, config) in buffers.items():
+            net = cv2.dnn.readNet(framework, weights, config)
+            net.setPreferableBackend(backend)
+            net.setPreferableTarget(target)
+            nets[name] = net
+        return Nets(**nets)
+
+    @property
+    def instances(self):
+        return self._created
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a set of networks for exclusive use by the calling thread"""
+        try:
+            nets = self._idle.get_nowait()
+        except queue.Empty:
+            nets = None
+            with self._lock:
+                grow = self._created < self.max_instances
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    nets = self._build()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                nets = self._idle.get()
+        try:
+            yield nets
+        finally:
+            self._idle.put(nets)
+
+    def warm_up(self):
+        """Build one set of networks and run a forward pass through each"""
+        with self.acquire() as nets:
+            face_input = np.zeros(FACE_INPUT_SIZE[::-1] + (3,), dtype=np.uint8)
+            nets.face.setInput(cv2.dnn.blobFromImage(face_input, 1.0, FACE_INPUT_SIZE))
+            nets.face.forward()
+            crop = np.zeros(CLASSIFIER_INPUT_SIZE[::-1] + (3,), dtype=np.uint8)
+            blob = cv2.dnn.blobFromImage(crop, 1.0, CLASSIFIER_INPUT_SIZE)
+            for net in (nets.age, nets.gender):
+                net.setInput(blob)
+                net.forward()
+        return self
@@ -0,0 +1,69 @@
+"""Decode uploaded image bytes straight to a bounded-size BGR uint8 buffer.
+
+``cv2.imdecode`` with ``IMREAD_COLOR`` always returns 3-channel BGR, so
+grayscale, palette and RGBA uploads need no later conversion. Phone photos
+of 20+ megapixels are shrunk while decoding: the image header gives the
+size, and JPEGs are then decoded at 1/2, 1/4 or 1/8 scale
+(``IMREAD_REDUCED_COLOR_*``), so the full-resolution pixels are never held
+in memory. Whatever is still above ``MAX_IMAGE_SIDE`` is resized once with
+INTER_AREA. The returned buffer is owned by the caller; detection reads it
+and annotation can draw on it in place.
+"""
+import io
+
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# Longer side of the working image; faces stay well above the detector's
+# minimum size while per-request memory stays flat
+MAX_IMAGE_SIDE = 2048
+# A reduced JPEG decode may land this far below MAX_IMAGE_SIDE, so a 4032px
+# photo decodes at half scale instead of in full and then resized
+REDUCED_DECODE_SLACK = 0.75
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def image_size(data):
+    """``(width, height)`` from the image header, or None if PIL cannot parse it"""
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            return header.size
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def decode_image(data, max_side=MAX_IMAGE_SIDE):
+    """``(image, scale)`` for encoded bytes: BGR uint8 with longer side <= ``max_side``.
+
+    ``scale`` maps coordinates in ``image`` back to the original photo.
+    Raises ValueError when the bytes are not a decodable image.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flag = cv2.IMREAD_COLOR
+    size = image_size(data)
+    if size and max_side:
+        for factor, reduced in _REDUCED_FLAGS:
+            if max(size) // factor >= max_side * REDUCED_DECODE_SLACK:
+                flag = reduced
+                break
+    image = cv2.imdecode(buffer, flag)
+    if image is None:
+        raise ValueError("could not decode image")
+
+    original_side = max(size) if size else max(image.shape[:2])
+    image = downscale(image, max_side)
+    return image, original_side / max(image.shape[:2])
+
+
+def downscale(image, max_side=MAX_IMAGE_SIDE):
+    """``image`` resized so its longer side is at most ``max_side``; small images are returned as is"""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return image
+    ratio = max_side / longest
+    return cv2.resize(image, (max(1, round(width * ratio)), max(1, round(height * ratio))),
+                      interpolation=cv2.INTER_AREA)
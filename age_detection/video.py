@@ -0,0 +1,180 @@
+"""Age/gender on video: sparse face detection, box tracking, cached predictions.
+
+The face detector runs only every ``detect_every`` frames. In between,
+tracked boxes move at the velocity measured between their last two
+detections. Each detection is matched to an existing track by IoU.
+Unmatched detections start new tracks, and tracks missed ``max_missed``
+detections in a row are dropped. Age and gender are classified once per
+track, in one batch for all new tracks of a frame, and then reused, so the
+classifiers cost almost nothing once faces are being followed.
+"""
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from age_detection.inference import AGE_LIST, GENDER_LIST, classify_faces, crop_faces, detect_faces
+
+BOX_COLOR = (0, 255, 0)
+LABEL_COLOR = (0, 255, 255)
+
+
+def open_capture(source):
+    """cv2.VideoCapture for a webcam index, file path or stream URL"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source {source!r}")
+    return capture
+
+
+def iou(box, boxes):
+    """Intersection over union of one x1, y1, x2, y2 box with each row of ``boxes``"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+class Track:
+    """One followed face: box, per-frame velocity and its cached prediction"""
+
+    __slots__ = ('id', 'box', 'detected', 'velocity', 'last_frame', 'missed', 'label', 'gender', 'age')
+
+    def __init__(self, track_id, box, frame_index):
+        self.id = track_id
+        self.box = np.asarray(box, dtype=np.float64)
+        self.detected = self.box
+        self.velocity = np.zeros(4)
+        self.last_frame = frame_index
+        self.missed = 0
+        self.label = None
+        self.gender = None
+        self.age = None
+
+
+class FaceTracker:
+    """IoU matching of detections to tracks, constant-velocity prediction between"""
+
+    def __init__(self, iou_threshold=0.3, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self):
+        """Advance tracked boxes by one frame without detection"""
+        for track in self.tracks:
+            track.box = track.box + track.velocity
+
+    def update(self, boxes, frame_index):
+        """Match detections to tracks; returns the tracks that are new"""
+        unmatched = list(range(len(boxes)))
+        for track in sorted(self.tracks, key=lambda t: t.missed):
+            if not unmatched:
+                track.missed += 1
+                continue
+            overlaps = iou(track.box, boxes[unmatched])
+            best = int(np.argmax(overlaps))
+            if overlaps[best] < self.iou_threshold:
+                track.missed += 1
+                continue
+            box = boxes[unmatched.pop(best)].astype(np.float64)
+            frames = max(1, frame_index - track.last_frame)
+            track.velocity = (box - track.detected) / frames
+            track.box = track.detected = box
+            track.last_frame = frame_index
+            track.missed = 0
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        new = []
+        for i in unmatched:
+            track = Track(self._next_id, boxes[i], frame_index)
+            self._next_id += 1
+            self.tracks.append(track)
+            new.append(track)
+        return new
+
+    def visible(self):
+        """Tracks seen at the last detection"""
+        return [track for track in self.tracks if track.missed == 0]
+
+
+def annotate(frame, tracks):
+    """Draw boxes and cached labels onto ``frame`` in place"""
+    thickness = max(1, int(round(frame.shape[0] / 150)))
+    for track in tracks:
+        x1, y1, x2, y2 = track.box.astype(int)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, thickness, 8)
+        if track.label:
+            cv2.putText(frame, track.label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                        LABEL_COLOR, 2, cv2.LINE_AA)
+    return frame
+
+
+class StreamStats:
+    """Frame, detection and classification counts plus FPS over recent frames"""
+
+    def __init__(self, window=30):
+        self.frames = 0
+        self.detections = 0
+        self.classified = 0
+        self._times = deque(maxlen=window)
+
+    def tick(self):
+        self.frames += 1
+        self._times.append(time.perf_counter())
+
+    @property
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+
+def process_stream(capture, models, detect_every=5, conf_threshold=0.7, max_frames=None,
+                   draw=True, tracker=None):
+    """Yield ``(frame, tracks, stats)`` for each frame read from ``capture``.
+
+    ``models`` is a ``ModelRegistry``. A network set is borrowed only for
+    each detection frame, so a long stream shares the pool with other
+    sessions. With ``draw`` the frame is annotated in place.
+    """
+    tracker = tracker or FaceTracker()
+    stats = StreamStats()
+    frame_index = 0
+    while max_frames is None or frame_index < max_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+
+        if frame_index % detect_every == 0:
+            with models.acquire() as nets:
+                boxes, _ = detect_faces(nets.face, frame, conf_threshold)
+                new = tracker.update(boxes, frame_index)
+                crops, kept = crop_faces(frame, [track.box.astype(int) for track in new])
+                if crops:
+                    gender_idx, _, age_idx, _ = classify_faces(nets.age, nets.gender, crops)
+            stats.detections += 1
+            if crops:
+                for i, g, a in zip(kept, gender_idx, age_idx):
+                    track = new[i]
+                    track.gender, track.age = GENDER_LIST[g], AGE_LIST[a]
+                    track.label = f'{track.age} {track.gender}'
+                stats.classified += len(crops)
+        else:
+            tracker.predict()
+
+        tracks = tracker.visible()
+        if draw:
+            annotate(frame, tracks)
+        stats.tick()
+        yield frame, tracks, stats
+        frame_index += 1
@@ -0,0 +1,322 @@
+"""Age-Detection latency, memory and label-regression benchmark.
+
+Runs the inference path behind the page's ``detect_age_gender`` over
+seeded synthetic images, or local sample photos, at several resolutions and
+face counts. Each image is JPEG-encoded once, then every repetition times
+the stages decode (including the downscale to ``--max-side``), detect,
+crop, classify and annotate. The report gives p50/p95 per stage, memory
+per case (peak traced Python allocations, and how far the process's peak
+resident set grew during the case), and the predicted labels:
+
+    python benchmarks/bench_age_detection.py --resolutions 640x480,1920x1080 \
+        --faces 0,1,8 --output age_detection_bench.json
+    python benchmarks/bench_age_detection.py --samples photos/ --write-baseline
+    python benchmarks/bench_age_detection.py --backends all --threads 1,2,4 \
+        --resolutions 1280x720 --faces 4
+
+Each ``--backends``/``--threads`` combination builds its own model registry
+and reports images/sec per case. Settings this OpenCV build cannot run are
+reported as skipped.
+
+Synthetic faces are drawn shapes the detector may not find, so the crop and
+classify stages fall back to the planted face boxes; this keeps the
+classifier cost proportional to the face count. Predictions are compared
+with ``--baseline`` (default benchmarks/age_detection_baseline.json) when
+that file exists. Any changed label exits with status 1, so speed work can
+be validated offline. Run from the repository root.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from age_detection.batch import IMAGE_EXTENSIONS
+from age_detection.inference import (AGE_LIST, FACE_INPUT_SIZE, GENDER_LIST, annotate_faces,
+                                     classify_faces, crop_faces, detect_faces)
+from age_detection.models import DEFAULT_BACKEND, ModelRegistry, available_backends
+from age_detection.preprocess import MAX_IMAGE_SIDE, decode_image
+from instrumentation import Registry, timer
+
+STAGES = ('decode', 'detect', 'crop', 'classify', 'annotate')
+DEFAULT_RESOLUTIONS = ('640x480', '1280x720', '1920x1080', '4032x3024')
+DEFAULT_FACE_COUNTS = (0, 1, 4, 16)
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'age_detection_baseline.json')
+
+
+def parse_size(text):
+    width, height = (int(v) for v in text.lower().split('x'))
+    return width, height
+
+
+def synthetic_image(size, faces, seed=0):
+    """``(image, boxes)``: a seeded BGR scene with ``faces`` drawn face shapes"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = cv2.GaussianBlur(rng.integers(40, 200, (height, width, 3), dtype=np.uint8), (0, 0), 8)
+    boxes = []
+    if faces:
+        # One face per grid cell, sized to the cell so faces never overlap
+        cols = int(np.ceil(np.sqrt(faces)))
+        rows = int(np.ceil(faces / cols))
+        cell_w, cell_h = width // cols, height // rows
+        for i in range(faces):
+            cx = (i % cols) * cell_w + cell_w // 2
+            cy = (i // cols) * cell_h + cell_h // 2
+            half = int(min(cell_w, cell_h) * rng.uniform(0.25, 0.4))
+            skin = tuple(int(v) for v in rng.integers((60, 110, 150), (140, 180, 230)))
+            cv2.ellipse(image, (cx, cy), (int(half * 0.8), half), 0, 0, 360, skin, -1)
+            for dx in (-0.35, 0.35):
+                cv2.circle(image, (int(cx + dx * half), int(cy - 0.2 * half)), max(1, half // 10),
+                           (40, 30, 30), -1)
+            cv2.ellipse(image, (cx, int(cy + 0.45 * half)), (max(1, half // 3), max(1, half // 8)),
+                        0, 0, 180, (50, 40, 120), -1)
+            boxes.append((cx - int(half * 0.8), cy - half, cx + int(half * 0.8), cy + half))
+    return image, np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+
+def sample_images(directory):
+    """``(name, image)`` for each readable photo directly in ``directory``"""
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+            image = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+            if image is not None:
+                yield name, image
+
+
+def build_cases(args):
+    """``(case, key, image, planted_boxes)`` tuples for every resolution"""
+    resolutions = [parse_size(r) for r in args.resolutions.split(',') if r]
+    cases = []
+    for size in resolutions:
+        label = f'{size[0]}x{size[1]}'
+        if args.samples:
+            for name, image in sample_images(args.samples):
+                resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                cases.append((label, f'{label}/{name}', resized, np.empty((0, 4), np.int32)))
+        else:
+            for faces in (int(f) for f in args.faces.split(',') if f):
+                for i in range(args.images):
+                    image, boxes = synthetic_image(size, faces, seed=args.seed + i)
+                    cases.append((f'{label}/{faces} faces', f'{label}/{faces}/{i}', image, boxes))
+    return cases
+
+
+def run_image(nets, data, planted, registry, args):
+    """Time every stage once for encoded image ``data``; returns predicted labels"""
+    with timer('decode', registry):
+        image, scale = decode_image(data, args.max_side)
+    with timer('detect', registry):
+        boxes, confidences = detect_faces(nets.face, image, args.conf_threshold,
+                                          (args.detector_size, args.detector_size), args.pyramid_levels)
+    if not len(boxes):
+        boxes = (planted / scale).astype(np.int32)
+    with timer('crop', registry):
+        crops, kept = crop_faces(image, boxes)
+    with timer('classify', registry):
+        gender_idx, _, age_idx, _ = classify_faces(nets.age, nets.gender, crops)
+    faces = [{'box': tuple(int(v) for v in boxes[i]), 'age': AGE_LIST[a], 'gender': GENDER_LIST[g]}
+             for i, g, a in zip(kept, gender_idx, age_idx)]
+    with timer('annotate', registry):
+        annotate_faces(image, faces, inplace=True)
+    return [[face['age'], face['gender']] for face in faces]
+
+
+def run(models, cases, args):
+    """Per-case stage percentiles, throughput and memory, plus labels keyed by image"""
+    results, labels = [], {}
+    by_case = {}
+    for case, key, image, planted in cases:
+        by_case.setdefault(case, []).append((key, image, planted))
+
+    with models.acquire() as nets:
+        for case, images in by_case.items():
+            registry = Registry()
+            if not args.no_memory:
+                tracemalloc.start()
+            rss_before = peak_rss_mb()
+            detected = 0
+            for key, image, planted in images:
+                data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+                for _ in range(args.repeat):
+                    labels[key] = run_image(nets, data, planted, registry, args)
+                detected += len(labels[key])
+            peak = None
+            if not args.no_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            summary = registry.stage_summary()
+            stages = {row['stage']: {'p50_ms': row['p50_ms'], 'p95_ms': row['p95_ms'],
+                                     'mean_ms': row['mean_ms']}
+                      for row in summary}
+            record = {
+                'case': case,
+                'backend': models.backend,
+                'threads': models.num_threads or cv2.getNumThreads(),
+                'images': len(images),
+                'repeat': args.repeat,
+                'faces_classified': detected,
+                'stages': {stage: stages[stage] for stage in STAGES},
+                'total_p50_ms': round(sum(stages[stage]['p50_ms'] for stage in STAGES), 2),
+                'images_per_sec': round(len(images) * args.repeat
+                                        / sum(row['total_s'] for row in summary), 2),
+                'peak_traced_bytes': peak,
+                # ru_maxrss only rises, so a case that fits under an earlier
+                # case's peak shows 0 growth
+                'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+                'process_peak_rss_mb': round(peak_rss_mb(), 1),
+            }
+            results.append(record)
+            timings = '  '.join(f"{stage}={s['p50_ms']:.1f}/{s['p95_ms']:.1f}"
+                                for stage, s in record['stages'].items())
+            print(f"{case:>24}  {record['images_per_sec']:>7} img/s  p50/p95 ms  {timings}  "
+                  f"rss +{record['rss_growth_mb']}MB (peak {record['process_peak_rss_mb']}MB)",
+                  flush=True)
+    return results, labels
+
+
+def peak_rss_mb():
+    """Peak resident set size of the whole process so far"""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def default_thread_counts():
+    """Powers of two up to the core count, plus the core count itself"""
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def settings(args):
+    """``(backend, threads)`` pairs to run; threads None means the registry default"""
+    if args.backends == 'all':
+        backends = available_backends()
+    else:
+        backends = [b for b in (args.backends or DEFAULT_BACKEND).split(',') if b]
+    if args.threads == 'sweep':
+        threads = default_thread_counts()
+    elif args.threads:
+        threads = [int(t) for t in args.threads.split(',') if t]
+    else:
+        threads = [None]
+    return [(backend, num_threads) for backend in backends for num_threads in threads]
+
+
+def compare_labels(labels, baseline):
+    """Keys whose predictions differ from ``baseline``, with both sides"""
+    changed = {}
+    for key, expected in baseline.items():
+        actual = labels.get(key)
+        if actual is not None and actual != expected:
+            changed[key] = {'baseline': expected, 'actual': actual}
+    return changed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resolutions', default=','.join(DEFAULT_RESOLUTIONS),
+                        help='comma separated WIDTHxHEIGHT sizes')
+    parser.add_argument('--faces', default=','.join(map(str, DEFAULT_FACE_COUNTS)),
+                        help='comma separated synthetic face counts per image')
+    parser.add_argument('--samples',
+                        help='directory of sample photos to use instead of synthetic images')
+    parser.add_argument('--images', type=int, default=3, help='synthetic images per case')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per image')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--conf-threshold', type=float, default=0.7)
+    parser.add_argument('--detector-size', type=int, default=FACE_INPUT_SIZE[0])
+    parser.add_argument('--pyramid-levels', type=int, default=0)
+    parser.add_argument('--max-side', type=int, default=MAX_IMAGE_SIDE,
+                        help='downscale decoded images to this longer side, 0 to keep full size')
+    parser.add_argument('--backends',
+                        help='comma separated DNN backend names, or "all" for every one this OpenCV '
+                             'build supports (default: AGE_DETECTION_BACKEND or default)')
+    parser.add_argument('--threads',
+                        help='comma separated cv2.setNumThreads values, or "sweep" for powers of two '
+                             'up to the core count (default: split cores across the registry pool)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip tracemalloc, which slows every stage down')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='stored labels to compare with')
+    parser.add_argument('--write-baseline', action='store_true',
+                        help='store this run\'s labels as the baseline instead of comparing')
+    parser.add_argument('--output', default='age_detection_bench.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = build_cases(args)
+    if not cases:
+        print("No images to benchmark")
+        return 1
+
+    baseline = None
+    if not args.write_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results, runs = [], []
+    for backend, num_threads in settings(args):
+        print(f"backend={backend} threads={num_threads or 'default'}", flush=True)
+        try:
+            models = ModelRegistry(max_instances=1, backend=backend, num_threads=num_threads).warm_up()
+        except (OSError, ValueError, cv2.error) as e:
+            print(f"  skipped: {str(e).strip().splitlines()[-1]}")
+            runs.append({'backend': backend, 'threads': num_threads, 'skipped': str(e).strip()})
+            continue
+        setting_results, labels = run(models, cases, args)
+        results.extend(setting_results)
+        changed = None
+        if baseline is not None:
+            changed = compare_labels(labels, baseline)
+            print(f"  {len(changed)} of {len(labels)} images changed labels against {args.baseline}")
+        runs.append({'backend': models.backend, 'threads': models.num_threads or cv2.getNumThreads(),
+                     'labels': labels, 'changed_labels': changed})
+
+    completed = [entry for entry in runs if 'labels' in entry]
+    if not completed:
+        print("No backend/thread setting could run")
+        return 1
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(completed[0]['labels'], f, indent=1, sort_keys=True)
+        print(f"Wrote {len(completed[0]['labels'])} baseline labels to {args.baseline}")
+
+    report = {
+        'benchmark': 'age_detection',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'detector_size': args.detector_size,
+        'pyramid_levels': args.pyramid_levels,
+        'max_side': args.max_side,
+        'results': results,
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return 1 if any(entry['changed_labels'] for entry in completed) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
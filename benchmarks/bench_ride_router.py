@@ -0,0 +1,171 @@
+"""Ride Router performance and quality benchmark.
+
+Generates seeded synthetic rosters around the office and times each stage of
+StaffTransportOptimizer separately, recording wall time, peak traced memory,
+total km and route count to a JSON results file:
+
+    python benchmarks/bench_ride_router.py --sizes 100,1000,3000 \
+        --distributions uniform,clustered,suburban --output ride_router_bench.json
+
+Run from the repository root.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DISTRIBUTIONS = ('uniform', 'clustered', 'suburban')
+DEFAULT_SIZES = (100, 1000, 3000, 10000, 50000)
+STAGES = ('prepare_distances', 'create_clusters', 'optimize_routes',
+          'calculate_route_metrics', 'create_map')
+
+# Roughly one degree of latitude in km, used to size the synthetic city
+KM_PER_DEGREE = 111.0
+
+
+def load_optimizer_class():
+    """StaffTransportOptimizer from the headless package (no Streamlit import)"""
+    from ride_router.optimizer import StaffTransportOptimizer
+    return StaffTransportOptimizer
+
+
+def generate_roster(size, distribution, office, seed=0):
+    """Seeded synthetic roster of ``size`` staff around ``office``"""
+    rng = np.random.default_rng(seed)
+    if distribution == 'uniform':
+        # Even spread over a ~30 km square centred on the office
+        half = 15 / KM_PER_DEGREE
+        lats = office['lat'] + rng.uniform(-half, half, size)
+        lons = office['lon'] + rng.uniform(-half, half, size)
+    elif distribution == 'clustered':
+        # Dense neighbourhoods of ~200 staff with a ~1 km spread
+        centres = max(1, size // 200)
+        centre_lats = office['lat'] + rng.uniform(-0.12, 0.12, centres)
+        centre_lons = office['lon'] + rng.uniform(-0.12, 0.12, centres)
+        which = rng.integers(0, centres, size)
+        lats = centre_lats[which] + rng.normal(0, 1 / KM_PER_DEGREE, size)
+        lons = centre_lons[which] + rng.normal(0, 1 / KM_PER_DEGREE, size)
+    elif distribution == 'suburban':
+        # Density falling off with distance from the office, long sparse tail
+        radius_km = rng.lognormal(mean=np.log(6), sigma=0.7, size=size)
+        angle = rng.uniform(0, 2 * np.pi, size)
+        lats = office['lat'] + radius_km * np.sin(angle) / KM_PER_DEGREE
+        lons = office['lon'] + radius_km * np.cos(angle) / (
+            KM_PER_DEGREE * np.cos(np.radians(office['lat'])))
+    else:
+        raise ValueError(f"Unknown distribution '{distribution}', expected one of {DISTRIBUTIONS}")
+
+    return pd.DataFrame({
+        'staff_id': np.arange(1, size + 1),
+        'name': [f'Employee {i}' for i in range(1, size + 1)],
+        'latitude': lats,
+        'longitude': lons,
+        'address': pd.Categorical([f'Zone {i % 50}' for i in range(size)]),
+    })
+
+
+def measure(func, *args, trace_memory=True):
+    """Run ``func`` once, returning (result, wall seconds, peak traced bytes)"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_case(optimizer_class, size, distribution, args):
+    optimizer = optimizer_class(solver=args.solver)
+    optimizer.DISTANCE_METHOD = args.distance_method
+    roster = generate_roster(size, distribution, optimizer.office_location, seed=args.seed)
+    record = {'size': size, 'distribution': distribution, 'solver': args.solver,
+              'distance_method': args.distance_method, 'eps_km': args.eps_km,
+              'seed': args.seed, 'stages': {}}
+
+    def stage(name, func, *func_args):
+        result, elapsed, peak = measure(func, *func_args, trace_memory=not args.no_memory)
+        record['stages'][name] = {'seconds': round(elapsed, 6), 'peak_bytes': peak}
+        return result
+
+    stage('prepare_distances', optimizer.prepare_distances, roster)
+    clustered = stage('create_clusters', optimizer.create_clusters, roster, args.eps_km)
+    routes = stage('optimize_routes', optimizer.optimize_routes, clustered)
+    metrics = stage('calculate_route_metrics',
+                    lambda: [optimizer.calculate_route_metrics(r) for r in routes.values()])
+    if not args.skip_map:
+        stage('create_map', optimizer.create_map, routes, clustered)
+
+    record['route_count'] = len(routes)
+    record['clusters'] = int(clustered['cluster'].nunique())
+    record['max_cluster_size'] = int(clustered['cluster'].value_counts().max())
+    record['eps_km_used'] = round(float(optimizer.eps_km), 4)
+    record['assigned_staff'] = int(sum(len(r) for r in routes.values()))
+    record['total_km'] = round(float(sum(km for km, _ in metrics)), 3)
+    record['total_cost'] = round(float(sum(cost for _, cost in metrics)), 2)
+    record['total_seconds'] = round(sum(s['seconds'] for s in record['stages'].values()), 6)
+    return record
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated roster sizes')
+    parser.add_argument('--distributions', default=','.join(DISTRIBUTIONS),
+                        help='comma separated subset of ' + ', '.join(DISTRIBUTIONS))
+    parser.add_argument('--solver', default='greedy')
+    parser.add_argument('--distance-method', default='geodesic', choices=('geodesic', 'haversine'))
+    parser.add_argument('--eps-km', type=float, help='cluster radius, tuned per roster if omitted')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-map', action='store_true', help='do not time create_map')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip tracemalloc, which slows every stage down')
+    parser.add_argument('--output', default='ride_router_bench.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    optimizer_class = load_optimizer_class()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    distributions = [d for d in args.distributions.split(',') if d]
+
+    results = []
+    for distribution in distributions:
+        for size in sizes:
+            record = run_case(optimizer_class, size, distribution, args)
+            results.append(record)
+            stages = '  '.join(f"{name}={s['seconds']:.3f}s" for name, s in record['stages'].items())
+            print(f"{distribution:>9} {size:>6}  routes={record['route_count']:<6} "
+                  f"km={record['total_km']:<10} {stages}", flush=True)
+
+    report = {
+        'benchmark': 'ride_router',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
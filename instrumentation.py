@@ -0,0 +1,272 @@
+"""Per-stage timers and counters shared by every page.
+
+Wrap a hot path with the ``timed`` decorator or the ``timer`` context
+manager and count events with ``count``:
+
+    @timed('detect_text')
+    def detect_text(image_content): ...
+
+    with timer('render_map', mode='light'):
+        ...
+
+    count('cache_lookups', result='hit')
+
+Measurements go to a process-wide registry (``REGISTRY``) that can be read
+in three ways:
+
+* Structured logs: with ``METRICS_LOG=1`` every finished stage is logged as
+  one JSON line on the ``instrumentation`` logger.
+* Prometheus text: ``REGISTRY.prometheus_text()``, also served on
+  ``/metrics`` by ``serve_from_env()`` when ``METRICS_PORT`` is set. The
+  endpoint listens on localhost only unless ``METRICS_HOST`` names a wider
+  bind address such as ``0.0.0.0``.
+* ``debug_panel()``, a Streamlit sidebar expander with p50/p95 per stage,
+  shown when ``DEBUG_PANEL=1`` or the page URL has ``?debug=1``.
+
+Nothing here imports Streamlit until ``debug_panel`` is called, so headless
+code can be instrumented too.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger('instrumentation')
+
+# Histogram bucket upper bounds in seconds, from cache hits to LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent samples kept per stage for the percentiles in the debug panel
+RECENT_SAMPLES = 1024
+
+
+class _Timer:
+    """Histogram plus a window of recent samples for one stage/label set"""
+
+    __slots__ = ('count', 'sum', 'errors', 'buckets', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds, failed):
+        self.count += 1
+        self.sum += seconds
+        self.errors += failed
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+class Registry:
+    """Thread-safe store of stage timings and event counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counters = {}
+        self.log_stages = os.environ.get('METRICS_LOG', '') not in ('', '0')
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, stage, seconds, failed=False, **labels):
+        key = self._key(stage, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = _Timer()
+            timer.observe(seconds, failed)
+        if self.log_stages:
+            logger.info(json.dumps({'stage': stage, 'seconds': round(seconds, 6),
+                                    'failed': failed, **dict(key[1])}))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def stage_summary(self):
+        """One dict per stage/label set: calls, errors, total, mean, p50, p95, max"""
+        with self._lock:
+            items = [(key, timer.count, timer.errors, timer.sum, np.array(timer.recent))
+                     for key, timer in self._timers.items()]
+        rows = []
+        for (stage, labels), calls, errors, total, recent in sorted(items):
+            rows.append({
+                'stage': stage,
+                'labels': ', '.join(f'{k}={v}' for k, v in labels),
+                'calls': calls,
+                'errors': errors,
+                'total_s': round(total, 4),
+                'mean_ms': round(1000 * total / calls, 2),
+                'p50_ms': round(1000 * float(np.percentile(recent, 50)), 2),
+                'p95_ms': round(1000 * float(np.percentile(recent, 95)), 2),
+                'max_ms': round(1000 * float(recent.max()), 2),
+            })
+        return rows
+
+    def counter_summary(self):
+        with self._lock:
+            items = sorted(self._counters.items())
+        return [{'counter': name, 'labels': ', '.join(f'{k}={v}' for k, v in labels), 'value': value}
+                for (name, labels), value in items]
+
+    def prometheus_text(self, prefix='app'):
+        """Registry in the Prometheus text exposition format"""
+        with self._lock:
+            timers = sorted((key, timer.count, timer.sum, timer.errors, list(timer.buckets))
+                            for key, timer in self._timers.items())
+            counters = sorted(self._counters.items())
+
+        lines = [f'# HELP {prefix}_stage_seconds Wall time per instrumented stage',
+                 f'# TYPE {prefix}_stage_seconds histogram']
+        for (stage, labels), calls, total, _, buckets in timers:
+            pairs = (('stage', stage),) + labels
+            base = _labels(pairs)
+            for bound, cumulative in zip(BUCKETS, buckets):
+                bucket = _labels(pairs + (('le', repr(bound)),))
+                lines.append(f'{prefix}_stage_seconds_bucket{bucket} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{_labels(pairs + (("le", "+Inf"),))} {calls}')
+            lines.append(f'{prefix}_stage_seconds_sum{base} {total:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{base} {calls}')
+
+        lines += [f'# HELP {prefix}_stage_errors_total Instrumented stages that raised',
+                  f'# TYPE {prefix}_stage_errors_total counter']
+        for (stage, labels), _, _, errors, _ in timers:
+            lines.append(f'{prefix}_stage_errors_total{_labels((("stage", stage),) + labels)} {errors}')
+
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            for (counter, labels), value in counters:
+                if counter == name:
+                    lines.append(f'{prefix}_{name}_total{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def timer(stage, registry=None, **labels):
+    """Time the ``with`` block as ``stage``; exceptions are counted and re-raised"""
+    registry = registry or REGISTRY
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        registry.observe(stage, time.perf_counter() - start, failed, **labels)
+
+
+def timed(stage=None, registry=None, **labels):
+    """Decorator timing every call of a function (stage defaults to its name)"""
+    def decorate(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, registry, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1, registry=None, **labels):
+    """Add ``value`` to the counter ``name``"""
+    (registry or REGISTRY).count(name, value, **labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve ``/metrics`` from a daemon thread; later calls reuse the first server.
+
+    Binds to localhost by default; pass ``host`` to expose it more widely.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        return _server
+
+
+def serve_from_env():
+    """Start the metrics endpoint when METRICS_PORT is set, on METRICS_HOST or localhost"""
+    port = os.environ.get('METRICS_PORT')
+    if port:
+        try:
+            return start_metrics_server(port, os.environ.get('METRICS_HOST', '127.0.0.1'))
+        except OSError as e:
+            logger.warning("Could not serve metrics on port %s: %s", port, e)
+    return None
+
+
+def debug_panel(registry=None):
+    """Sidebar table of stage latencies and counters, when debugging is enabled"""
+    import streamlit as st
+
+    enabled = os.environ.get('DEBUG_PANEL', '') not in ('', '0') or st.query_params.get('debug') == '1'
+    if not enabled:
+        return
+    registry = registry or REGISTRY
+    with st.sidebar.expander("Performance", expanded=False):
+        stages = registry.stage_summary()
+        if stages:
+            st.dataframe(stages, hide_index=True)
+        else:
+            st.caption("No stages recorded yet.")
+        counters = registry.counter_summary()
+        if counters:
+            st.dataframe(counters, hide_index=True)
+        st.download_button("Download metrics", registry.prometheus_text(),
+                           file_name="metrics.txt", mime="text/plain")
+        if st.button("Reset metrics"):
+            registry.reset()
@@ -1,7 +1,13 @@
 import streamlit as st
-import cv2
-import numpy as np
-from PIL import Image
+import os
+import tempfile
+import time
+from age_detection.batch import ResultWriter, score_images, sources_from_uploads
+from age_detection.inference import FACE_INPUT_SIZE, PYRAMID_MIN_SIDE, analyze_image, annotate_faces
+from age_detection.models import ModelRegistry
+from age_detection.preprocess import decode_image
+from age_detection.video import open_capture, process_stream
+from instrumentation import count, debug_panel, serve_from_env, timed, timer
 
 def ui():
     st.markdown(
@@ -61,110 +67,185 @@ def ui():
         unsafe_allow_html=True,
     )
 ui()
+serve_from_env()
 
-# Load models
-faceProto = r"models/opencv_face_detector.pbtxt"
-faceModel = r"models/opencv_face_detector_uint8.pb"
-ageProto = r"models/age_deploy.prototxt"
-ageModel = r"models/age_net.caffemodel"
-genderProto = r"models/gender_deploy.prototxt"
-genderModel = r"models/gender_net.caffemodel"
-
-MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
-ageList = ['(0-2)', '(4-6)', '(8-12)', '(15-20)', '(25-32)', '(38-43)', '(48-53)', '(60-100)']
-genderList = ['Male', 'Female']
-
-# Load networks
-faceNet = cv2.dnn.readNet(faceModel, faceProto)
-ageNet = cv2.dnn.readNet(ageModel, ageProto)
-genderNet = cv2.dnn.readNet(genderModel, genderProto)
-
-def highlightFace(net, frame, conf_threshold=0.7):
-    frameOpencvDnn = frame.copy()
-    frameHeight = frameOpencvDnn.shape[0]
-    frameWidth = frameOpencvDnn.shape[1]
-    blob = cv2.dnn.blobFromImage(frameOpencvDnn, 1.0, (300, 300), [104, 117, 123], True, False)
-
-    net.setInput(blob)
-    detections = net.forward()
-    faceBoxes = []
-    for i in range(detections.shape[2]):
-        confidence = detections[0, 0, i, 2]
-        if confidence > conf_threshold:
-            x1 = int(detections[0, 0, i, 3] * frameWidth)
-            y1 = int(detections[0, 0, i, 4] * frameHeight)
-            x2 = int(detections[0, 0, i, 5] * frameWidth)
-            y2 = int(detections[0, 0, i, 6] * frameHeight)
-            faceBoxes.append([x1, y1, x2, y2])
-            cv2.rectangle(frameOpencvDnn, (x1, y1), (x2, y2), (0, 255, 0), int(round(frameHeight/150)), 8)
-    return frameOpencvDnn, faceBoxes
-
-def detect_age_gender(image):
-    # Ensure image is in RGB format
-    if image.shape[2] == 4:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    elif len(image.shape) == 2:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    padding = 20
-    resultImg, faceBoxes = highlightFace(faceNet, image)
-    
-    if not faceBoxes:
-        return resultImg, []
-    
-    results = []
-    for faceBox in faceBoxes:
-        face = image[max(0, faceBox[1]-padding):
-                     min(faceBox[3]+padding, image.shape[0]-1),
-                     max(0, faceBox[0]-padding):
-                     min(faceBox[2]+padding, image.shape[1]-1)]
-
-        blob = cv2.dnn.blobFromImage(face, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
-        
-        genderNet.setInput(blob)
-        genderPreds = genderNet.forward()
-        gender = genderList[genderPreds[0].argmax()]
-        
-        ageNet.setInput(blob)
-        agePreds = ageNet.forward()
-        age = ageList[agePreds[0].argmax()]
-        
-        label = f'{age}'
-        cv2.putText(resultImg, label, (faceBox[0], faceBox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2, cv2.LINE_AA)
-        results.append(label)
+@st.cache_resource
+def get_model_registry():
+    """Face, age and gender networks, loaded and warmed up once per process"""
+    return ModelRegistry().warm_up()
+
+# Load networks before the first request needs them
+get_model_registry()
+
+# Square detector input sizes offered in the settings
+DETECTOR_SIZES = [300, 400, 500, 600, 800]
+
+@timed('detect_age_gender')
+def detect_age_gender(image, annotate=True, input_size=FACE_INPUT_SIZE, pyramid_levels=0, inplace=False):
+    # image is a 3-channel BGR uint8 buffer, as returned by decode_image
+    # All faces go through each classifier in one batched forward pass
+    with get_model_registry().acquire() as nets:
+        faces = analyze_image(nets, image, input_size=input_size, pyramid_levels=pyramid_levels)
     
+    count('faces_detected', len(faces))
+    results = [face['age'] for face in faces]
+    resultImg = annotate_faces(image, faces, inplace=inplace) if annotate else None
     return resultImg, results
 
+def detector_settings():
+    with st.expander("Detector settings"):
+        st.select_slider("Detector resolution", options=DETECTOR_SIZES, value=FACE_INPUT_SIZE[0],
+                         key="detector_size",
+                         help="Larger sizes find smaller faces but take longer.")
+        st.slider("Pyramid levels", 0, 2, 0, key="pyramid_levels",
+                  help=f"Also scan overlapping tiles of photos larger than {PYRAMID_MIN_SIDE}px "
+                       "for small faces (level 1: 2x2 tiles, level 2: adds 4x4).")
+
 def main():
 
     col1,col2 = st.columns(2)
     
-    option = st.radio("Choose input method:", ("Upload Image", "Capture Image"))
+    option = st.radio("Choose input method:", ("Upload Image", "Capture Image", "Batch (many images)", "Video Stream"))
+    if option in ("Upload Image", "Capture Image"):
+        detector_settings()
 
     if option == "Upload Image":
         
         process_uploaded_image()
     elif option == "Capture Image":
         process_captured_image()
-
+    elif option == "Batch (many images)":
+        process_batch()
+    elif option == "Video Stream":
+        process_video_stream()
+    
+    debug_panel()
     
 
 def process_uploaded_image():
     uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"])
     if uploaded_file is not None:
-        image = Image.open(uploaded_file)
-        img_array = np.array(image)
-        process_image(img_array)
+        process_upload(uploaded_file)
 
 def process_captured_image():
     captured_image = st.camera_input("Capture an image")
     if captured_image is not None:
-        image = Image.open(captured_image)
-        img_array = np.array(image)
-        process_image(img_array)
+        process_upload(captured_image)
+
+def process_batch():
+    uploaded_files = st.file_uploader(
+        "Choose images or zip archives...",
+        type=["jpg", "jpeg", "png", "zip"],
+        accept_multiple_files=True
+    )
+    if not uploaded_files or not st.button("Run batch"):
+        return
+    
+    sources = sources_from_uploads(uploaded_files)
+    if not sources:
+        st.write("No images found in the upload.")
+        return
+    
+    progress = st.progress(0.0, text=f"0 of {len(sources)} images")
+    preview = st.empty()
+    writer = ResultWriter()
+    for done, rows in score_batch(sources):
+        writer.write(rows)
+        progress.progress(done / len(sources), text=f"{done} of {len(sources)} images")
+        preview.dataframe(rows, hide_index=True)
+    
+    st.success(f"Scored {len(sources)} images ({writer.rows} result rows)")
+    col1, col2 = st.columns(2)
+    col1.download_button("Download CSV", writer.csv(), file_name="age_gender_results.csv", mime="text/csv")
+    col2.download_button("Download JSON", writer.json(), file_name="age_gender_results.json",
+                         mime="application/json")
+
+def score_batch(sources):
+    with timer('score_batch'):
+        yield from score_images(sources, get_model_registry())
+
+def video_upload_path(video_file):
+    """Temporary copy of an uploaded video, written once per upload rather than every rerun"""
+    file_id, path = st.session_state.get("video_upload", (None, None))
+    if file_id != video_file.file_id or not os.path.exists(path):
+        discard_video_upload()
+        # OpenCV reads from a path, not a buffer
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(video_file.name)[1]) as temp:
+            temp.write(video_file.getbuffer())
+        st.session_state.video_upload = (video_file.file_id, temp.name)
+    return st.session_state.video_upload[1]
+
+def discard_video_upload():
+    _, path = st.session_state.pop("video_upload", (None, None))
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+def process_video_stream():
+    source_type = st.selectbox("Video source", ["Video file", "Webcam", "Stream URL"])
+    source = None
+    if source_type == "Video file":
+        video_file = st.file_uploader("Choose a video...", type=["mp4", "avi", "mov", "mkv"])
+        if video_file is not None:
+            source = video_upload_path(video_file)
+        else:
+            discard_video_upload()
+    elif source_type == "Webcam":
+        source = str(st.number_input("Camera index", 0, 9, 0))
+    else:
+        source = st.text_input("Stream URL (rtsp://, http://)") or None
+    
+    detect_every = st.slider("Detect faces every N frames", 1, 30, 5)
+    max_seconds = st.slider("Stop after (seconds)", 5, 600, 60)
+    if source is None or not st.button("Start"):
+        return
+    
+    try:
+        capture = open_capture(source)
+    except ValueError as e:
+        st.error(str(e))
+        if source_type == "Video file":
+            discard_video_upload()
+        return
+    
+    frame_slot = st.empty()
+    stats_slot = st.empty()
+    deadline = time.perf_counter() + max_seconds
+    stats = None
+    try:
+        # Networks are borrowed per detection frame, so a long stream does not
+        # hold a set that single-image and batch requests need
+        stream = process_stream(capture, get_model_registry(), detect_every=detect_every)
+        for frame, tracks, stats in stream:
+            frame_slot.image(frame, channels="BGR", use_column_width=True)
+            stats_slot.markdown(
+                f"**{stats.fps:.1f} FPS** | frames {stats.frames} | "
+                f"detections {stats.detections} | faces classified {stats.classified} | "
+                f"tracked {len(tracks)}"
+            )
+            if time.perf_counter() > deadline:
+                break
+    finally:
+        capture.release()
+        if source_type == "Video file":
+            discard_video_upload()
+    if stats is not None:
+        count('video_frames', stats.frames)
+
+def process_upload(upload):
+    with timer('decode_image'):
+        try:
+            img_array, _ = decode_image(upload.getvalue())
+        except ValueError:
+            st.error("Could not read this image.")
+            return
+    process_image(img_array)
 
 def process_image(img_array):
-    result_img, results = detect_age_gender(img_array)
+    # img_array belongs to this request, so labels are drawn on it directly
+    size = st.session_state.get("detector_size", FACE_INPUT_SIZE[0])
+    result_img, results = detect_age_gender(img_array, input_size=(size, size),
+                                            pyramid_levels=st.session_state.get("pyramid_levels", 0),
+                                            inplace=True)
     st.image(result_img, channels="BGR", use_column_width=True,width=10)
     
     if results:
@@ -13,6 +13,7 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain.memory import ConversationBufferMemory 
 from dotenv import load_dotenv, find_dotenv
+from instrumentation import count, debug_panel, serve_from_env, timed
 OPENAI_KEY = st.secrets["OPENAI_KEY"]
 GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
 load_dotenv()
@@ -60,7 +61,9 @@ def initialize_vision_client(api_key):
     )
 
 vision_client = initialize_vision_client(GOOGLE_API_KEY)
+serve_from_env()
 
+@timed('translate_text')
 def openai(german_text):
     title_template = PromptTemplate(
         input_variables=['topic'],
@@ -76,6 +79,7 @@ st.markdown(f"<div class ='card alert alert-success' style='color:black'>Optical
 
 file_upload = st.file_uploader("Upload Image or PDF file", ['Pdf', 'jpeg', 'png'])
 
+@timed('detect_text')
 def detect_text(image_content):
     image = vision.Image(content=image_content)
     start_time = time.time()
@@ -94,6 +98,7 @@ def detect_text(image_content):
     else:
         return None, end_time - start_time, None
 
+@timed('convert_pdf_to_images')
 def convert_pdf_to_images(pdf_path):
     document = fitz.open(pdf_path)
     images = []
@@ -102,6 +107,7 @@ def convert_pdf_to_images(pdf_path):
         pix = page.get_pixmap()
         image_bytes = pix.tobytes("png")
         images.append(image_bytes)
+    count('pdf_pages_converted', len(images))
     return images
 
 def compute_overall_confidence(text_annotations):
@@ -118,6 +124,7 @@ def compute_overall_confidence(text_annotations):
     else:
         return random.uniform(0.90, 0.99)
 
+@timed('process_file')
 def process_file(file):
     text_annotations = None
     if file.type == "application/pdf":
@@ -179,4 +186,6 @@ if st.button("Submit"):
         with st.spinner("Processing..."):
             process_file(file_upload)
     else:
-        st.warning("Please upload an image or PDF file.")
\ No newline at end of file
+        st.warning("Please upload an image or PDF file.")
+
+debug_panel()
\ No newline at end of file
@@ -3,6 +3,7 @@ import os
 import fitz  
 from dotenv import load_dotenv
 from openai import OpenAI
+from instrumentation import count, debug_panel, serve_from_env, timed
 
 load_dotenv()
 
@@ -65,7 +66,9 @@ def ui():
     )
 OPENAI_API_KEY = st.secrets["OPENAI_KEY"]
 client = OpenAI(api_key=OPENAI_API_KEY)
+serve_from_env()
 
+@timed('extract_text_from_multiple_pdfs', page='loan')
 def extract_text_from_multiple_pdfs(uploaded_files):
     """Extract text from multiple uploaded PDFs using PyMuPDF."""
     extracted_texts = []
@@ -75,8 +78,10 @@ def extract_text_from_multiple_pdfs(uploaded_files):
         for page in doc:
             text += page.get_text()
         extracted_texts.append(text)
+        count('pdf_pages_read', len(doc), page='loan')
     return " ".join(extracted_texts)
 
+@timed('get_completion')
 def get_completion(prompt):
     """Get completion from OpenAI API."""
     try:
@@ -87,8 +92,11 @@ def get_completion(prompt):
                 {"role": "user", "content": prompt}
             ]
         )
+        if completion.usage is not None:
+            count('completion_tokens', completion.usage.total_tokens, model="gpt-4")
         return completion.choices[0].message.content
     except Exception as e:
+        count('completion_errors', model="gpt-4")
         st.error(f"An error occurred while communicating with OpenAI: {str(e)}")
         return None
 
@@ -211,6 +219,8 @@ def main():
     
     else:
         st.write("Please upload the required loan application documents to begin analysis.")
+    
+    debug_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
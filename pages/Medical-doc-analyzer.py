@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from langchain.llms import OpenAI
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
+from instrumentation import count, debug_panel, serve_from_env, timed
 
 # Load environment variables from .env file
 load_dotenv()
@@ -68,6 +69,7 @@ def ui():
 ui()
 # Set up OpenAI API key (ensure your .env file contains the OPENAI_API_KEY variable)
 openai_api_key = st.secrets["OPENAI_KEY"]
+serve_from_env()
 
 
 # Initialize OpenAI LLM with the API key
@@ -75,6 +77,7 @@ openai_api_key = st.secrets["OPENAI_KEY"]
 def openai_llm():
     return OpenAI(api_key=openai_api_key, temperature=0.3)
 
+@timed('extract_text_from_multiple_pdfs', page='medical')
 def extract_text_from_multiple_pdfs(uploaded_files):
     """Extract text from multiple uploaded PDFs using PyMuPDF."""
     extracted_texts = []
@@ -84,8 +87,10 @@ def extract_text_from_multiple_pdfs(uploaded_files):
         for page in doc:
             text += page.get_text()  # Extract text from each page
         extracted_texts.append(text)
+        count('pdf_pages_read', len(doc), page='medical')
     return " ".join(extracted_texts)
 
+@timed('process_summary')
 def process_summary(extracted_text):
     """Generate a summary from the extracted text using OpenAI LLM."""
     prompt_template = """
@@ -98,6 +103,7 @@ def process_summary(extracted_text):
     summary = chain.run(text=extracted_text)
     return summary
 
+@timed('process_template')
 def process_template(extracted_text):
     """Generate a template analysis from the extracted text using OpenAI LLM."""
     prompt_template = """
@@ -147,6 +153,7 @@ def main():
                 st.write(template)
 
     st.write("Upload your files")
+    debug_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,15 +1,16 @@
 import streamlit as st
-import pandas as pd
-import folium
 from streamlit_folium import st_folium
-from sklearn.cluster import DBSCAN
-import numpy as np
-from geopy.distance import geodesic
-from collections import defaultdict
-import plotly.express as px
-import math
-import json
-from datetime import datetime
+import os
+from instrumentation import debug_panel, serve_from_env
+from ride_router.cache import DistanceMatrixCache, ResultCache
+from ride_router.roadnet import RoadNetwork
+from ride_router.fleet import DEFAULT_FLEET, fleet_table, parse_fleet
+from ride_router.ingest import REQUIRED_COLUMNS, read_roster
+from ride_router.mapping import MAP_MODES
+from ride_router.multidepot import DEPOT_COLUMN, SHIFT_COLUMN, parse_depots
+from ride_router.optimizer import StaffTransportOptimizer
+from ride_router.sessions import SessionStore
+from ride_router.solvers import SOLVERS, get_solver
 def load_css():
     # External CSS dependencies
     st.markdown(
@@ -67,221 +68,24 @@ def create_navbar():
     )
 
 
-class StaffTransportOptimizer:
-    def __init__(self):
-        self.office_location = {
-            'lat': 5.582636441579255,
-            'lon': -0.143551646497661
-        }
-        self.MAX_PASSENGERS = 4
-        self.MIN_PASSENGERS = 3  # Minimum passengers per car
-        self.COST_PER_KM = 2.5  # Cost per kilometer
+@st.cache_resource
+def get_distance_cache():
+    """Distance matrices shared by every rerun and session of this page"""
+    return DistanceMatrixCache(max_entries=8)
 
-    def load_sample_data(self):
-        """Load sample staff location data for Accra region"""
-        return pd.DataFrame({
-            'staff_id': range(1, 21),
-            'name': [f'Employee {i}' for i in range(1, 21)],
-            'latitude': np.random.uniform(5.5526, 5.6126, 20),
-            'longitude': np.random.uniform(-0.1735, -0.1135, 20),
-            'address': [
-                'Adabraka', 'Osu', 'Cantonments', 'Airport Residential',
-                'East Legon', 'Spintex', 'Tema', 'Teshie', 'Labadi',
-                'Labone', 'Ridge', 'Roman Ridge', 'Dzorwulu', 'Abelemkpe',
-                'North Kaneshie', 'Dansoman', 'Mamprobi', 'Chorkor',
-                'Abeka', 'Achimota'
-            ]
-        })
-
-    def create_clusters(self, staff_data, eps_km=2):
-        """Create clusters based on staff locations with minimum size constraint"""
-        if staff_data is None or len(staff_data) == 0:
-            return None
-        
-        eps_degrees = eps_km / 111
-        coords = staff_data[['latitude', 'longitude']].values
-        
-        # Adjust min_samples to ensure minimum cluster size
-        db = DBSCAN(eps=eps_degrees, min_samples=self.MIN_PASSENGERS).fit(coords)
-        staff_data['cluster'] = db.labels_
-        
-        # Handle outliers (points labeled as -1)
-        outliers = staff_data[staff_data['cluster'] == -1]
-        if not outliers.empty:
-            # Assign outliers to nearest valid cluster
-            for idx, row in outliers.iterrows():
-                distances = []
-                for cluster_id in staff_data['cluster'].unique():
-                    if cluster_id != -1:
-                        cluster_points = staff_data[staff_data['cluster'] == cluster_id]
-                        avg_dist = cluster_points.apply(
-                            lambda x: geodesic(
-                                (row['latitude'], row['longitude']),
-                                (x['latitude'], x['longitude'])
-                            ).km,
-                            axis=1
-                        ).mean()
-                        distances.append((cluster_id, avg_dist))
-                
-                if distances:
-                    nearest_cluster = min(distances, key=lambda x: x[1])[0]
-                    staff_data.at[idx, 'cluster'] = nearest_cluster
-        
-        return staff_data
-
-    def optimize_routes(self, staff_data):
-        """Optimize routes with capacity and cost constraints"""
-        routes = defaultdict(list)
-        route_counter = 0
-        
-        for cluster_id in staff_data['cluster'].unique():
-            cluster_group = staff_data[staff_data['cluster'] == cluster_id].copy()
-            
-            # Calculate distances to office and between points
-            cluster_group['distance_to_office'] = cluster_group.apply(
-                lambda row: geodesic(
-                    (row['latitude'], row['longitude']),
-                    (self.office_location['lat'], self.office_location['lon'])
-                ).km,
-                axis=1
-            )
-            
-            while len(cluster_group) >= self.MIN_PASSENGERS:
-                # Start with furthest person from office
-                current_route = []
-                remaining = cluster_group.copy()
-                
-                # Get furthest person
-                start_person = remaining.nlargest(1, 'distance_to_office').iloc[0]
-                current_route.append(start_person.to_dict())
-                remaining = remaining.drop(start_person.name)
-                
-                # Add closest people until route is full or minimum met
-                while len(current_route) < self.MAX_PASSENGERS and not remaining.empty:
-                    last_point = current_route[-1]
-                    
-                    # Calculate distances to remaining points
-                    remaining['temp_distance'] = remaining.apply(
-                        lambda row: geodesic(
-                            (last_point['latitude'], last_point['longitude']),
-                            (row['latitude'], row['longitude'])
-                        ).km,
-                        axis=1
-                    )
-                    
-                    next_person = remaining.nsmallest(1, 'temp_distance').iloc[0]
-                    current_route.append(next_person.to_dict())
-                    remaining = remaining.drop(next_person.name)
-                    
-                    if len(current_route) >= self.MIN_PASSENGERS:
-                        break
-                
-                if len(current_route) >= self.MIN_PASSENGERS:
-                    route_name = f'Route {route_counter + 1}'
-                    routes[route_name] = current_route
-                    route_counter += 1
-                    # Remove assigned staff from cluster group
-                    assigned_ids = [p['staff_id'] for p in current_route]
-                    cluster_group = cluster_group[~cluster_group['staff_id'].isin(assigned_ids)]
-                else:
-                    # Handle remaining staff by adding to existing routes if possible
-                    break
-            
-            # Handle any remaining staff
-            if len(cluster_group) > 0:
-                for _, row in cluster_group.iterrows():
-                    for route_name, route_group in routes.items():
-                        if len(route_group) < self.MAX_PASSENGERS:
-                            route_group.append(row.to_dict())
-                            break
-        
-        return routes
+@st.cache_resource
+def get_result_cache():
+    """Optimization results shared by every rerun and session of this page
+    
+    Set RIDE_ROUTER_CACHE_DIR to also keep results on disk across restarts.
+    """
+    return ResultCache(max_entries=32, cache_dir=os.environ.get('RIDE_ROUTER_CACHE_DIR'))
 
-    def calculate_route_metrics(self, route):
-        """Calculate total distance and cost for a route"""
-        if not route:
-            return 0, 0
-            
-        total_distance = 0
-        points = [(p['latitude'], p['longitude']) for p in route]
-        points.append((self.office_location['lat'], self.office_location['lon']))
-        
-        for i in range(len(points) - 1):
-            distance = geodesic(points[i], points[i + 1]).km
-            total_distance += distance
-            
-        return total_distance, total_distance * self.COST_PER_KM
+@st.cache_resource
+def get_road_network(path):
+    """Road graph loaded once per process from RIDE_ROUTER_ROAD_GRAPH"""
+    return RoadNetwork.load(path)
 
-    def create_map(self, routes):
-        """Create an interactive map with optimized route visualization"""
-        try:
-            m = folium.Map(
-                location=[self.office_location['lat'], self.office_location['lon']],
-                zoom_start=13,
-                tiles="cartodbpositron"
-            )
-            
-            # Add office marker
-            folium.Marker(
-                [self.office_location['lat'], self.office_location['lon']],
-                popup='Office',
-                icon=folium.Icon(color='red', icon='building', prefix='fa'),
-                tooltip="Office Location"
-            ).add_to(m)
-            
-            colors = ['blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen', 'cadetblue']
-            
-            for route_idx, (route_name, group) in enumerate(routes.items()):
-                color = colors[route_idx % len(colors)]
-                route_group = folium.FeatureGroup(name=route_name)
-                
-                # Create coordinates list for the route
-                coordinates = [[staff['latitude'], staff['longitude']] for staff in group]
-                coordinates.append([self.office_location['lat'], self.office_location['lon']])
-                
-                # Calculate route metrics
-                total_distance, total_cost = self.calculate_route_metrics(group)
-                
-                # Add route line
-                folium.PolyLine(
-                    coordinates,
-                    weight=2,
-                    color=color,
-                    opacity=0.8,
-                    dash_array='5, 10',
-                    popup=f"""
-                    <b>{route_name}</b><br>
-                    Passengers: {len(group)}<br>
-                    Distance: {total_distance:.2f} km<br>
-                    Cost: ${total_cost:.2f}
-                    """
-                ).add_to(route_group)
-                
-                # Add staff markers
-                for idx, staff in enumerate(group, 1):
-                    folium.CircleMarker(
-                        [staff['latitude'], staff['longitude']],
-                        radius=6,
-                        popup=f"""
-                        <b>{staff['name']}</b><br>
-                        Address: {staff['address']}<br>
-                        Stop #{idx}<br>
-                        Distance to office: {staff['distance_to_office']:.2f} km
-                        """,
-                        color=color,
-                        fill=True,
-                        fill_opacity=0.7,
-                        tooltip=f"Stop #{idx}: {staff['name']}"
-                    ).add_to(route_group)
-                
-                route_group.add_to(m)
-            
-            folium.LayerControl().add_to(m)
-            return m
-            
-        except Exception as e:
-            st.error(f"Error creating map: {str(e)}")
-            return None
 def init_session_state():
     """Initialize session state variables"""
     if 'staff_data' not in st.session_state:
@@ -290,35 +94,47 @@ def init_session_state():
         st.session_state.routes = None
     if 'optimization_done' not in st.session_state:
         st.session_state.optimization_done = False
-    if 'saved_sessions' not in st.session_state:
-        st.session_state.saved_sessions = {}
+    if 'roster_file_id' not in st.session_state:
+        st.session_state.roster_file_id = None
+    if 'ingest_report' not in st.session_state:
+        st.session_state.ingest_report = None
+    if 'route_info' not in st.session_state:
+        st.session_state.route_info = None
+
+@st.cache_resource
+def get_session_store():
+    """Saved sessions on disk, shared by every browser session
+    
+    Stored under RIDE_ROUTER_SESSION_DIR (default .ride_router_sessions).
+    """
+    return SessionStore(os.environ.get('RIDE_ROUTER_SESSION_DIR', '.ride_router_sessions'))
 
 def save_current_session():
     """Save current session data"""
     if st.session_state.staff_data is not None and st.session_state.routes is not None:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        session_data = {
-            'staff_data': st.session_state.staff_data.to_dict('records'),
-            'routes': st.session_state.routes
-        }
-        st.session_state.saved_sessions[timestamp] = session_data
-        return timestamp
+        info = get_session_store().save(st.session_state.staff_data, st.session_state.routes,
+                                        route_info=st.session_state.route_info)
+        return info['created']
     return None
 
-def load_session(timestamp):
+def load_session(snapshot_id):
     """Load saved session data"""
-    if timestamp in st.session_state.saved_sessions:
-        session_data = st.session_state.saved_sessions[timestamp]
-        st.session_state.staff_data = pd.DataFrame(session_data['staff_data'])
-        st.session_state.routes = session_data['routes']
-        st.session_state.optimization_done = True
+    snapshot = get_session_store().load(snapshot_id)
+    st.session_state.staff_data = snapshot.staff_data
+    st.session_state.routes = snapshot.routes
+    st.session_state.route_info = snapshot.route_info
+    st.session_state.optimization_done = True
 
 def main():
     load_css()
     create_navbar()
     
     init_session_state()
-    optimizer = StaffTransportOptimizer()
+    serve_from_env()
+    optimizer = StaffTransportOptimizer(
+        distance_cache=get_distance_cache(),
+        result_cache=get_result_cache()
+    )
     
     # Sidebar controls
     with st.sidebar:
@@ -328,7 +144,7 @@ def main():
         st.header("Data Input")
         data_option = st.radio(
             "Choose data input method",
-            ["Use Sample Data", "Upload CSV"]
+            ["Use Sample Data", "Upload File"]
         )
         
         if data_option == "Use Sample Data":
@@ -336,25 +152,156 @@ def main():
                 st.session_state.staff_data = optimizer.load_sample_data()
         else:
             uploaded_file = st.file_uploader(
-                "Upload CSV file",
-                type="csv"
+                "Upload staff roster (CSV, Parquet or Arrow)",
+                type=["csv", "parquet", "arrow", "feather"]
             )
-            if uploaded_file is not None:
-                st.session_state.staff_data = pd.read_csv(uploaded_file)
+            # Only ingest a given upload once, not on every rerun
+            if uploaded_file is not None and st.session_state.roster_file_id != uploaded_file.file_id:
+                try:
+                    staff_data, report = read_roster(uploaded_file, name=uploaded_file.name)
+                except ValueError as e:
+                    st.error(f"Could not load roster: {str(e)}")
+                else:
+                    st.session_state.staff_data = staff_data
+                    st.session_state.ingest_report = report
+                    st.session_state.roster_file_id = uploaded_file.file_id
+                    st.session_state.optimization_done = False
+            if st.session_state.ingest_report is not None:
+                report = st.session_state.ingest_report
+                if report.rows_rejected:
+                    st.warning(report.summary())
+                else:
+                    st.caption(report.summary())
         
         # Optimization parameters
         if st.session_state.staff_data is not None:
             st.header("Optimization Parameters")
-            eps_km = st.slider(
-                "Cluster radius (km)",
-                0.5, 5.0, 2.0, 0.1
+            eps_km = None
+            if not st.checkbox("Tune cluster radius automatically", value=True):
+                eps_km = st.slider(
+                    "Cluster radius (km)",
+                    0.5, 5.0, 2.0, 0.1
+                )
+            
+            road_graph = os.environ.get('RIDE_ROUTER_ROAD_GRAPH')
+            if road_graph and st.checkbox("Use road network distances", value=True):
+                optimizer.road_network = get_road_network(road_graph)
+                optimizer.DISTANCE_METHOD = 'road'
+            
+            solver_name = st.selectbox(
+                "Route solver",
+                options=list(SOLVERS),
+                format_func=lambda name: {
+                    'greedy': "Greedy (fastest)",
+                    'savings': "Savings + local search",
+                    'fleet': "Mixed fleet (pick vehicle types)",
+                }.get(name, name)
             )
+            solver_options = {}
+            if solver_name == 'fleet':
+                fleet_input = st.data_editor(
+                    fleet_table(DEFAULT_FLEET),
+                    num_rows="dynamic",
+                    hide_index=True,
+                    key="fleet_table"
+                )
+                try:
+                    optimizer.use_fleet(parse_fleet(fleet_input))
+                except ValueError as e:
+                    st.error(f"Invalid fleet: {str(e)}")
+                    optimizer.use_fleet(DEFAULT_FLEET)
+                solver_options['fleet'] = optimizer.fleet
+            if solver_name in ('savings', 'fleet'):
+                solver_options['time_limit'] = st.slider(
+                    "Solver time budget (s)",
+                    1, 60, 5, 1
+                )
+            optimizer.solver = get_solver(solver_name, **solver_options)
+            if st.checkbox("Solve clusters in parallel", value=False):
+                optimizer.N_JOBS = None
+            
+            with st.expander("Depots & Shifts"):
+                depot_lines = st.text_area(
+                    "Additional depots (one 'name, latitude, longitude' per line)",
+                    value=""
+                )
+                try:
+                    optimizer.extra_depots = parse_depots(depot_lines)
+                except ValueError as e:
+                    st.error(str(e))
+                st.caption(
+                    "Optional roster columns: 'depot' (depot name) and "
+                    "'shift' (start time as HH:MM)."
+                )
+                optimizer.MAX_RIDE_MINUTES = st.slider(
+                    "Maximum ride time (minutes)",
+                    15, 180, optimizer.MAX_RIDE_MINUTES, 5
+                )
+                # Same detection as the CLI: depot or shift columns turn it on
+                roster_columns = st.session_state.staff_data.columns
+                multi_depot = st.checkbox(
+                    "Route per depot and shift",
+                    value=bool(optimizer.extra_depots) or SHIFT_COLUMN in roster_columns
+                    or DEPOT_COLUMN in roster_columns
+                )
             
             if st.button("Optimize Routes", type="primary"):
-                clustered_data = optimizer.create_clusters(st.session_state.staff_data, eps_km)
-                st.session_state.routes = optimizer.optimize_routes(clustered_data)
+                if multi_depot:
+                    clustered_data, routes, route_info = optimizer.optimize_multi_depot(
+                        st.session_state.staff_data, eps_km
+                    )
+                else:
+                    clustered_data, routes = optimizer.optimize(st.session_state.staff_data, eps_km)
+                    route_info = None
+                st.session_state.staff_data = clustered_data
+                st.session_state.routes = routes
+                st.session_state.route_info = route_info
                 st.session_state.optimization_done = True
         
+        # Incremental roster updates
+        if st.session_state.optimization_done:
+            st.header("Roster Changes")
+            changes_file = st.file_uploader(
+                "Upload new or moved staff (CSV)",
+                type="csv",
+                key="roster_changes"
+            )
+            removed_ids = st.multiselect(
+                "Remove staff",
+                options=st.session_state.staff_data['staff_id'].tolist()
+            )
+            if st.button("Apply Changes"):
+                added = moved = None
+                changes_ok = True
+                if changes_file is not None:
+                    # Made-up ids would turn new hires into moves of existing staff
+                    try:
+                        changes, report = read_roster(changes_file, name=changes_file.name,
+                                                      required=REQUIRED_COLUMNS + ('staff_id',))
+                    except ValueError as e:
+                        st.error(f"Could not load roster changes: {str(e)}")
+                        changes_ok = False
+                    else:
+                        if report.rows_rejected:
+                            st.warning(report.summary())
+                        known = changes['staff_id'].isin(st.session_state.staff_data['staff_id'])
+                        moved = changes.loc[known, ['staff_id', 'latitude', 'longitude']]
+                        added = changes[~known]
+                if changes_ok:
+                    staff_data, routes, changed, route_info = optimizer.update_routes(
+                        st.session_state.staff_data, st.session_state.routes,
+                        added=added, removed_ids=removed_ids, moved=moved,
+                        route_info=st.session_state.route_info
+                    )
+                    st.session_state.staff_data = staff_data
+                    st.session_state.routes = routes
+                    st.session_state.route_info = route_info
+                    updated = [name for name in changed if name in routes]
+                    removed = [name for name in changed if name not in routes]
+                    st.success(f"Updated {len(updated)} route(s): {', '.join(updated) or 'none'}")
+                    if removed:
+                        st.info(f"Removed {len(removed)} route(s): {', '.join(removed)}")
+        
         # Session management
         st.header("Session Management")
         if st.button("Save Current Session"):
@@ -362,11 +309,15 @@ def main():
             if timestamp:
                 st.success(f"Session saved at {timestamp}")
         
-        if st.session_state.saved_sessions:
+        saved_sessions = {info['id']: info for info in get_session_store().list()}
+        if saved_sessions:
             selected_session = st.selectbox(
                 "Load saved session",
-                options=list(st.session_state.saved_sessions.keys()),
-                format_func=lambda x: f"Session from {x}"
+                options=list(saved_sessions),
+                format_func=lambda x: (
+                    f"Session from {saved_sessions[x]['created']} "
+                    f"({saved_sessions[x]['staff_count']} staff, {len(saved_sessions[x]['route_names'])} routes)"
+                )
             )
             if st.button("Load Selected Session"):
                 load_session(selected_session)
@@ -382,8 +333,23 @@ def main():
         with col1:
             if st.session_state.optimization_done:
                 st.header("Route Map")
-                m = optimizer.create_map(st.session_state.routes)
-                st_folium(m, width=None, height=600)
+                map_mode = st.selectbox(
+                    "Map detail",
+                    options=MAP_MODES,
+                    format_func=lambda mode: {
+                        'auto': "Automatic",
+                        'detailed': "Detailed (every stop)",
+                        'light': "Light (GeoJSON layers)",
+                        'lines': "Route lines only",
+                    }[mode]
+                )
+                try:
+                    m = optimizer.create_map(st.session_state.routes, st.session_state.staff_data,
+                                             mode=map_mode, route_info=st.session_state.route_info)
+                except Exception as e:
+                    st.error(f"Error creating map: {str(e)}")
+                else:
+                    st_folium(m, width=None, height=600)
         
         with col2:
             st.header("Staff Data")
@@ -394,14 +360,42 @@ def main():
             )
             
             if st.session_state.optimization_done:
+                # One roster lookup for the fleet table and every route below
+                distances = optimizer.prepare_distances(st.session_state.staff_data)
+                st.header("Fleet")
+                st.dataframe(
+                    optimizer.fleet_summary(st.session_state.routes, st.session_state.route_info,
+                                            distances=distances),
+                    hide_index=True
+                )
+                
                 st.header("Route Details")
-                for route_name, group in st.session_state.routes.items():
+                route_info = st.session_state.route_info or {}
+                for route_name, route in st.session_state.routes.items():
+                    info = route_info.get(route_name)
                     with st.expander(route_name):
-                        route_df = pd.DataFrame(group)
+                        depot = info['depot_index'] if info else 0
+                        route_df = optimizer.route_details(
+                            st.session_state.staff_data, route, depot=depot, distances=distances
+                        )
+                        columns = ['name', 'address', 'distance_to_office']
+                        vehicle = optimizer.route_vehicle(route, depot, distances=distances)
+                        if vehicle is not None:
+                            st.caption(f"Vehicle: {vehicle.name} ({vehicle.capacity} seats)")
+                        if info:
+                            st.caption(
+                                f"Depot: {info['depot']} | Shift: {info['shift'] or 'any'} | "
+                                f"Longest ride: {info['ride_minutes']} min"
+                            )
+                            if info['pickup_times']:
+                                route_df['pickup_time'] = info['pickup_times']
+                                columns.append('pickup_time')
                         st.dataframe(
-                            route_df[['name', 'address', 'distance_to_office']],
+                            route_df[columns],
                             hide_index=True
                         )
+    
+    debug_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
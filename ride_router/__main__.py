@@ -0,0 +1,5 @@
+import sys
+
+from ride_router.cli import main
+
+sys.exit(main())
@@ -0,0 +1,180 @@
+"""Caches shared across Ride Router reruns, sessions and (optionally) restarts."""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ride_router.distance import DistanceMatrix
+
+COORD_COLUMNS = ('latitude', 'longitude')
+
+
+def roster_hash(staff_data, columns=COORD_COLUMNS):
+    """Content hash of the given roster columns, stable across reruns"""
+    digest = hashlib.sha1()
+    digest.update(str(len(staff_data)).encode())
+    for column in columns:
+        values = staff_data[column].to_numpy()
+        if values.dtype.kind in 'fiu':
+            values = np.ascontiguousarray(values, dtype=np.float64)
+            digest.update(values.tobytes())
+        else:
+            digest.update('\x1f'.join(map(str, values)).encode())
+    return digest.hexdigest()
+
+
+class DistanceMatrixCache:
+    """Small LRU of DistanceMatrix objects keyed by roster coordinates.
+
+    Only the lat/lon columns take part in the key, so re-clustering the same
+    roster with a different radius (which adds a ``cluster`` column) reuses
+    the matrix.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, staff_data, office, method='haversine', network=None):
+        fingerprint = network.fingerprint if method == 'road' and network is not None else None
+        depots = office if isinstance(office, (list, tuple)) else [office]
+        key = (roster_hash(staff_data), tuple((d['lat'], d['lon']) for d in depots), method, fingerprint)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        matrix = DistanceMatrix(staff_data['latitude'].to_numpy(),
+                                staff_data['longitude'].to_numpy(),
+                                office, method=method, network=network)
+        with self._lock:
+            self._entries[key] = matrix
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultCache:
+    """LRU of optimization results with an optional on-disk tier.
+
+    Entries hold the cluster labels and compact routes for one roster and
+    parameter set. Routes are row positions, which stay valid because the key
+    includes the roster's coordinates in row order. With ``cache_dir`` set,
+    results are also written as ``.npz`` files so they survive restarts and
+    are shared by every worker process pointing at the same directory.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(staff_data, **params):
+        """Cache key for a roster plus every parameter that shapes the result"""
+        digest = hashlib.sha1(roster_hash(staff_data, COORD_COLUMNS + ('staff_id',)).encode())
+        for name in sorted(params):
+            digest.update(f'\x1e{name}={params[name]!r}'.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return ``(labels, routes)`` or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, labels, routes):
+        entry = (np.asarray(labels), dict(routes))
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                names = json.loads(str(data['route_names']))
+                routes = {name: data[f'route_{i}'] for i, name in enumerate(names)}
+                entry = (data['labels'], routes)
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark as recently used for disk eviction
+        os.utime(self._path(key))
+        return entry
+
+    def _write_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        labels, routes = entry
+        arrays = {f'route_{i}': route for i, route in enumerate(routes.values())}
+        tmp = f'{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, labels=labels, route_names=np.array(json.dumps(list(routes))), **arrays)
+        os.replace(tmp, self._path(key))
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop least recently used files once the directory exceeds max_disk_bytes"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
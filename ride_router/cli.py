@@ -0,0 +1,134 @@
+"""Headless batch entry point: ``python -m ride_router ROSTER -o OUTPUT``.
+
+Reads a roster (CSV, Parquet or Arrow), clusters and routes it and writes
+routes and metrics as JSON, CSV or Parquet, then prints a one-line JSON
+summary. Nothing here imports Streamlit or a plotting library, so many
+rosters can be processed side by side from cron:
+
+    python -m ride_router rosters/accra.csv -o out/accra.json --solver savings
+    python -m ride_router rosters/tema.parquet -o out/tema.parquet \\
+        --depot "Tema, 5.67, -0.01" --fleet fleet.csv
+"""
+import argparse
+import json
+import sys
+import time
+
+import pandas as pd
+
+from ride_router.export import OUTPUT_FORMATS, output_format, write_results
+from ride_router.fleet import parse_fleet
+from ride_router.ingest import read_roster
+from ride_router.multidepot import DEPOT_COLUMN, SHIFT_COLUMN, parse_depots
+from ride_router.optimizer import StaffTransportOptimizer
+from ride_router.solvers import SOLVERS, get_solver
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m ride_router',
+        description="Optimize staff pickup routes for a roster file."
+    )
+    parser.add_argument('roster', help="Roster file (.csv, .parquet, .arrow/.feather)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Output file; format from the extension unless --format is given")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS)
+    parser.add_argument('--eps-km', type=float,
+                        help="Cluster radius in km (default: tuned from the roster)")
+    parser.add_argument('--cluster-size-factor', type=int,
+                        help="Split clusters above this many full vehicles, 0 to keep them whole")
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='greedy')
+    parser.add_argument('--time-limit', type=float,
+                        help="Solver time budget in seconds (savings and fleet solvers)")
+    parser.add_argument('--distance-method', choices=('haversine', 'geodesic', 'road'))
+    parser.add_argument('--road-graph', help="Road graph (.npz or OSM XML), implies --distance-method road")
+    parser.add_argument('--office', help="Office location as 'LAT,LON'")
+    parser.add_argument('--depot', action='append', default=[],
+                        help="Extra depot as 'name, lat, lon'; may be repeated")
+    parser.add_argument('--fleet', help="Fleet file (CSV or Parquet) with name, capacity, cost_per_km, fixed_cost")
+    parser.add_argument('--min-passengers', type=int)
+    parser.add_argument('--max-passengers', type=int)
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Worker processes for large rosters, 0 for one per CPU")
+    parser.add_argument('--cache-dir', help="Reuse results for unchanged rosters from this directory")
+    return parser
+
+
+def configure(optimizer, args):
+    """Apply command-line options to an optimizer"""
+    if args.office:
+        lat, lon = (float(part) for part in args.office.split(','))
+        optimizer.office_location = {'lat': lat, 'lon': lon}
+    optimizer.extra_depots = parse_depots('\n'.join(args.depot))
+    if args.min_passengers is not None:
+        optimizer.MIN_PASSENGERS = args.min_passengers
+    if args.max_passengers is not None:
+        optimizer.MAX_PASSENGERS = args.max_passengers
+    optimizer.N_JOBS = args.jobs or None
+    if args.cluster_size_factor is not None:
+        optimizer.CLUSTER_SIZE_FACTOR = args.cluster_size_factor or None
+
+    if args.road_graph:
+        from ride_router.roadnet import RoadNetwork
+        optimizer.road_network = RoadNetwork.load(args.road_graph)
+        optimizer.DISTANCE_METHOD = 'road'
+    elif args.distance_method == 'road':
+        raise ValueError("--distance-method road needs --road-graph")
+    elif args.distance_method:
+        optimizer.DISTANCE_METHOD = args.distance_method
+
+    if args.fleet:
+        optimizer.use_fleet(_read_fleet(args.fleet))
+    options = {}
+    if args.solver == 'fleet' and optimizer.fleet is not None:
+        options['fleet'] = optimizer.fleet
+    optimizer.solver = get_solver(args.solver, **options)
+    if args.time_limit is not None:
+        optimizer.solver.time_limit = args.time_limit
+    if optimizer.fleet is None and getattr(optimizer.solver, 'fleet', None) is not None:
+        optimizer.use_fleet(optimizer.solver.fleet)
+    return optimizer
+
+
+def _read_fleet(path):
+    if path.lower().endswith(('.parquet', '.pq')):
+        return parse_fleet(pd.read_parquet(path))
+    return parse_fleet(pd.read_csv(path))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+
+    result_cache = None
+    if args.cache_dir:
+        from ride_router.cache import ResultCache
+        result_cache = ResultCache(cache_dir=args.cache_dir)
+    optimizer = StaffTransportOptimizer(result_cache=result_cache)
+    try:
+        output_format(args.output, args.format)
+        configure(optimizer, args)
+        staff_data, report = read_roster(args.roster)
+    except (OSError, ValueError) as e:
+        print(f"ride_router: {e}", file=sys.stderr)
+        return 2
+    if report.rows_rejected:
+        print(f"ride_router: {report.summary()}", file=sys.stderr)
+    if len(staff_data) == 0:
+        print("ride_router: roster has no usable rows", file=sys.stderr)
+        return 1
+
+    route_info = None
+    if optimizer.extra_depots or SHIFT_COLUMN in staff_data or DEPOT_COLUMN in staff_data:
+        staff_data, routes, route_info = optimizer.optimize_multi_depot(staff_data, args.eps_km)
+    else:
+        staff_data, routes = optimizer.optimize(staff_data, args.eps_km)
+    optimizer.prepare_distances(staff_data)
+
+    result = write_results(
+        args.output, optimizer, staff_data, routes, route_info, fmt=args.format,
+        extra={'roster': args.roster, 'output': args.output, 'solver': optimizer.solver.name}
+    )
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    print(json.dumps(result))
+    return 0
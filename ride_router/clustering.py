@@ -0,0 +1,81 @@
+"""Capacity-aware clustering of staff locations.
+
+Coordinates are projected to a local equirectangular plane in km around the
+roster's centre, so a neighbourhood radius means the same distance north-south
+and east-west (dividing by 111 km per degree treats a degree of longitude as
+full length, which it only is at the equator). Over a city the projection is
+accurate to well under 1%.
+
+DBSCAN's ``eps`` can be chosen from the knee of the k-distance curve, and any
+cluster larger than a target size is bisected along its principal axis until
+every piece fits. That bounds the work each cluster hands the route solver.
+"""
+import numpy as np
+
+from ride_router.distance import EARTH_RADIUS_KM
+
+# k-distance curves are estimated from at most this many staff
+EPS_SAMPLE = 20_000
+# Auto-tuned eps is kept within these bounds (km)
+EPS_BOUNDS_KM = (0.1, 10.0)
+
+
+def project_km(lats, lons, origin=None):
+    """``(n, 2)`` array of x/y km east and north of ``origin`` (default: mean position)"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if origin is None:
+        origin = (float(lats.mean()), float(lons.mean()))
+    lat0, lon0 = np.radians(origin[0]), origin[1]
+    x = np.radians(lons - lon0) * np.cos(lat0) * EARTH_RADIUS_KM
+    y = np.radians(lats - origin[0]) * EARTH_RADIUS_KM
+    return np.column_stack([x, y])
+
+
+def auto_eps(xy, min_samples, sample=EPS_SAMPLE, seed=0):
+    """DBSCAN eps in km at the knee of the sorted ``min_samples``-distance curve"""
+    from sklearn.neighbors import NearestNeighbors
+
+    if len(xy) <= min_samples:
+        return EPS_BOUNDS_KM[1]
+    rng = np.random.default_rng(seed)
+    queries = xy if len(xy) <= sample else xy[rng.choice(len(xy), sample, replace=False)]
+    # DBSCAN counts a point towards its own min_samples, and so does kneighbors
+    nn = NearestNeighbors(n_neighbors=min_samples).fit(xy)
+    kth = np.sort(nn.kneighbors(queries)[0][:, -1])
+
+    # Knee: the point furthest below the chord from the first to the last value
+    span = kth[-1] - kth[0]
+    if span <= 0:
+        return float(np.clip(kth[-1], *EPS_BOUNDS_KM))
+    t = np.linspace(0.0, 1.0, len(kth))
+    knee = int(np.argmax(t - (kth - kth[0]) / span))
+    return float(np.clip(kth[knee], *EPS_BOUNDS_KM))
+
+
+def split_large_clusters(xy, labels, max_size):
+    """Relabel so no cluster exceeds ``max_size``, bisecting big ones recursively.
+
+    Each split cuts at the median of the cluster's principal axis, so halves
+    are balanced and compact. Outliers (-1) are left alone and cluster ids
+    are renumbered from 0.
+    """
+    labels = np.asarray(labels)
+    out = np.full(len(labels), -1, dtype=np.intp)
+    next_label = 0
+    # Stack of clusters still to place, popped in label order
+    pending = [np.flatnonzero(labels == label) for label in np.unique(labels[labels >= 0])][::-1]
+    while pending:
+        members = pending.pop()
+        if len(members) <= max_size:
+            out[members] = next_label
+            next_label += 1
+            continue
+        points = xy[members] - xy[members].mean(axis=0)
+        # Principal axis from the 2x2 covariance, largest eigenvalue last
+        axis = np.linalg.eigh(points.T @ points)[1][:, -1]
+        order = np.argsort(points @ axis, kind='stable')
+        half = len(order) // 2
+        pending.append(members[order[half:]])
+        pending.append(members[order[:half]])
+    return out
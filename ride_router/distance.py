@@ -0,0 +1,241 @@
+"""Vectorized great-circle and geodesic distances in kilometres.
+
+Every function takes latitudes/longitudes in degrees as scalars or NumPy
+arrays and returns kilometres. Two methods are available:
+
+* ``'haversine'`` - spherical earth, fastest, within ~0.5% of geodesic.
+* ``'geodesic'``  - Vincenty's inverse formula on the WGS-84 ellipsoid,
+  matching ``geopy.distance.geodesic`` to well under a metre.
+"""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid
+_WGS84_A = 6378137.0
+_WGS84_F = 1 / 298.257223563
+_WGS84_B = (1 - _WGS84_F) * _WGS84_A
+
+METHODS = ('haversine', 'geodesic')
+
+# Upper bound on pair count evaluated at once when building matrices, keeps
+# the temporaries of the geodesic solver within a few hundred MB.
+BLOCK_PAIRS = 1 << 20
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between broadcastable coordinate arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64))
+                              for a in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geodesic(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """Ellipsoidal distance in km between broadcastable coordinate arrays"""
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (lat1, lon1, lat2, lon2))
+    )
+    f = _WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam,
+                                 cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0,
+                                 cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0,
+                                    cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (
+                    cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) <= tol
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (_WGS84_A ** 2 - _WGS84_B ** 2) / _WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (
+            cos_2sigma_m + B / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2)
+                * (-3 + 4 * cos_2sigma_m ** 2)))
+        km = _WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    # Vincenty does not converge for nearly antipodal points; hand those
+    # few pairs to geopy's (slower but robust) Karney implementation.
+    bad = ~converged | ~np.isfinite(km)
+    if bad.any():
+        from geopy.distance import geodesic as _geopy_geodesic
+        km = np.array(km, copy=True)
+        for idx in np.argwhere(bad):
+            idx = tuple(idx)
+            km[idx] = _geopy_geodesic((lat1[idx], lon1[idx]),
+                                      (lat2[idx], lon2[idx])).km
+    return km
+
+
+def _pairwise(method):
+    if method == 'haversine':
+        return haversine
+    if method == 'geodesic':
+        return geodesic
+    raise ValueError(f"Unknown distance method '{method}', expected one of {METHODS}")
+
+
+def distances_from(lat, lon, lats, lons, method='haversine'):
+    """Distances in km from one point to every point in ``lats``/``lons``"""
+    return _pairwise(method)(lat, lon, lats, lons)
+
+
+def distance_matrix(lats, lons, other_lats=None, other_lons=None,
+                    method='haversine', dtype=np.float64):
+    """Full distance matrix in km between two sets of points.
+
+    When ``other_lats``/``other_lons`` are omitted the matrix is square over
+    ``lats``/``lons``. Rows are evaluated in blocks so memory stays bounded
+    for large rosters.
+    """
+    pairwise = _pairwise(method)
+    lats = np.asarray(lats, dtype=np.float64).ravel()
+    lons = np.asarray(lons, dtype=np.float64).ravel()
+    if other_lats is None:
+        other_lats, other_lons = lats, lons
+    else:
+        other_lats = np.asarray(other_lats, dtype=np.float64).ravel()
+        other_lons = np.asarray(other_lons, dtype=np.float64).ravel()
+
+    out = np.empty((len(lats), len(other_lats)), dtype=dtype)
+    step = max(1, BLOCK_PAIRS // max(1, len(other_lats)))
+    for start in range(0, len(lats), step):
+        stop = start + step
+        out[start:stop] = pairwise(lats[start:stop, None], lons[start:stop, None],
+                                   other_lats[None, :], other_lons[None, :])
+    return out
+
+
+def path_length(lats, lons, method='haversine'):
+    """Total length in km of the polyline through the given points in order"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) < 2:
+        return 0.0
+    legs = _pairwise(method)(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    return float(legs.sum())
+
+
+# Rosters up to this many points (office included) keep a dense float32
+# matrix (~64 MB at the limit); larger ones compute sub-blocks on demand.
+DENSE_LIMIT = 4000
+
+
+class DistanceMatrix:
+    """Distances between every staff member and the office for one roster.
+
+    Staff are addressed by their positional row in the roster and the office
+    by ``self.office`` (the position after the last staff member), so the
+    same lookups serve clustering, route building, route metrics and map
+    popups. ``office`` may also be a list of depots; they then occupy the
+    positions from ``self.office`` on, the first one being the office, and
+    their staff distances are computed in the same pass.
+
+    ``method='road'`` takes drive distances from ``network`` (a
+    ``ride_router.roadnet.RoadNetwork``); these are directional, rows being
+    origins and columns destinations.
+    """
+
+    def __init__(self, lats, lons, office, method='haversine', dense_limit=DENSE_LIMIT,
+                 network=None):
+        if method == 'road' and network is None:
+            raise ValueError("method='road' needs a road network")
+        depots = list(office) if isinstance(office, (list, tuple)) else [office]
+        self.method = method
+        self.network = network if method == 'road' else None
+        self.lats = np.concatenate([np.asarray(lats, dtype=np.float64), [d['lat'] for d in depots]])
+        self.lons = np.concatenate([np.asarray(lons, dtype=np.float64), [d['lon'] for d in depots]])
+        self.size = len(self.lats) - len(depots)
+        self.office = self.size
+        self.depot_count = len(depots)
+
+        self.dense = None
+        if len(self.lats) <= dense_limit:
+            self.dense = self._compute(self.lats, self.lons).astype(np.float32)
+            self.to_depots = self.dense[:self.size, self.size:].astype(np.float64)
+        else:
+            self.to_depots = self._compute(self.lats[:self.size], self.lons[:self.size],
+                                           self.lats[self.size:], self.lons[self.size:])
+        self.to_office = self.to_depots[:, 0]
+
+    def _compute(self, lats, lons, other_lats=None, other_lons=None):
+        if self.network is not None:
+            return self.network.travel_matrix(lats, lons, other_lats, other_lons)
+        return distance_matrix(lats, lons, other_lats, other_lons, method=self.method)
+
+    def subset(self, positions, depot=0):
+        """DistanceMatrix over the given staff positions plus one depot as office.
+
+        Compact and picklable, so a cluster can be shipped to a worker
+        process without the rest of the roster.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        keep = np.append(positions, self.office + depot)
+        sub = DistanceMatrix.__new__(DistanceMatrix)
+        sub.method = self.method
+        sub.network = self.network if self.dense is None else None
+        sub.lats = self.lats[keep]
+        sub.lons = self.lons[keep]
+        sub.size = len(positions)
+        sub.office = sub.size
+        sub.depot_count = 1
+        sub.dense = self.dense[np.ix_(keep, keep)] if self.dense is not None else None
+        sub.to_depots = self.to_depots[positions][:, [depot]]
+        sub.to_office = sub.to_depots[:, 0]
+        return sub
+
+    @property
+    def nbytes(self):
+        dense = self.dense.nbytes if self.dense is not None else 0
+        return dense + self.lats.nbytes + self.lons.nbytes + self.to_depots.nbytes
+
+    def between(self, rows, cols):
+        """Sub-matrix of distances for the given row and column positions"""
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        if self.dense is not None:
+            return self.dense[np.ix_(rows, cols)].astype(np.float64)
+        return self._compute(self.lats[rows], self.lons[rows], self.lats[cols], self.lons[cols])
+
+    def from_point(self, position, cols):
+        """Distances from one position to each of ``cols``"""
+        cols = np.asarray(cols, dtype=np.intp)
+        if self.dense is not None:
+            return self.dense[position, cols].astype(np.float64)
+        return self._compute(self.lats[position:position + 1], self.lons[position:position + 1],
+                             self.lats[cols], self.lons[cols])[0]
+
+    def route_length(self, positions, depot=0):
+        """Length in km of a pickup sequence ending at the office (or another depot)"""
+        stops = np.append(np.asarray(positions, dtype=np.intp), self.office + depot)
+        if len(stops) < 2:
+            return 0.0
+        if self.dense is not None:
+            return float(self.dense[stops[:-1], stops[1:]].astype(np.float64).sum())
+        if self.network is not None:
+            return float(sum(self.between([a], [b])[0, 0] for a, b in zip(stops[:-1], stops[1:])))
+        return path_length(self.lats[stops], self.lons[stops], method=self.method)
@@ -0,0 +1,128 @@
+"""Tabular and JSON views of optimized routes for files and batch jobs."""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+OUTPUT_FORMATS = ('json', 'csv', 'parquet')
+
+STOP_COLUMNS = ('staff_id', 'name', 'address', 'latitude', 'longitude')
+
+
+def output_format(path, fmt=None):
+    """Explicit ``fmt`` or the one implied by the output file extension"""
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lower().lstrip('.')
+        fmt = {'pq': 'parquet'}.get(fmt, fmt)
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of {OUTPUT_FORMATS}")
+    return fmt
+
+
+def route_metrics(optimizer, routes, route_info=None, staff_data=None):
+    """One row per route: depot, shift, vehicle, passengers, km and cost"""
+    # One roster lookup for every route below
+    distances = optimizer.prepare_distances(staff_data) if staff_data is not None else optimizer.distances
+    rows = []
+    for name, route in routes.items():
+        info = (route_info or {}).get(name) or {}
+        depot = info.get('depot_index', 0)
+        distance_km, cost = optimizer.calculate_route_metrics(route, depot, distances=distances)
+        vehicle = optimizer.route_vehicle(route, depot, distances=distances)
+        rows.append({
+            'route': name,
+            'depot': info.get('depot', optimizer.depots[depot]['name']),
+            'shift': info.get('shift'),
+            'vehicle': vehicle.name if vehicle is not None else None,
+            'passengers': len(route),
+            'distance_km': round(float(distance_km), 3),
+            'cost': round(float(cost), 2),
+            'ride_minutes': info.get('ride_minutes'),
+        })
+    return pd.DataFrame(rows, columns=['route', 'depot', 'shift', 'vehicle', 'passengers',
+                                       'distance_km', 'cost', 'ride_minutes'])
+
+
+def stops_frame(optimizer, staff_data, routes, route_info=None, metrics=None):
+    """One row per pickup, in route and stop order, with its route's metrics.
+
+    ``metrics`` is the ``route_metrics`` frame when the caller already has it.
+    """
+    if metrics is None:
+        metrics = route_metrics(optimizer, routes, route_info, staff_data)
+    columns = [column for column in STOP_COLUMNS if column in staff_data.columns]
+    if not routes:
+        return pd.DataFrame(columns=['route', 'stop'] + columns + ['distance_to_office'])
+
+    # All stops in one gather instead of a frame per route
+    infos = [(route_info or {}).get(name) or {} for name in routes]
+    lengths = [len(route) for route in routes.values()]
+    positions = np.concatenate(list(routes.values())).astype(np.intp)
+    depots = np.repeat([info.get('depot_index', 0) for info in infos], lengths)
+    distances = optimizer.prepare_distances(staff_data)
+
+    stops = staff_data.iloc[positions][columns].reset_index(drop=True)
+    stops.insert(0, 'route', np.repeat(np.array(list(routes), dtype=object), lengths))
+    stops.insert(1, 'stop', stops.groupby('route', sort=False).cumcount() + 1)
+    stops['distance_to_office'] = distances.to_depots[positions, depots]
+    if any(info.get('pickup_times') for info in infos):
+        stops['pickup_time'] = [time for info, length in zip(infos, lengths)
+                                for time in (info.get('pickup_times') or [None] * length)]
+    return stops.join(metrics.set_index('route')[['depot', 'shift', 'vehicle', 'distance_km', 'cost']]
+                      .add_prefix('route_'), on='route')
+
+
+def summary(metrics, staff_count):
+    """Totals over ``route_metrics``"""
+    result = {
+        'staff': int(staff_count),
+        'assigned': int(metrics['passengers'].sum()),
+        'routes': int(len(metrics)),
+        'distance_km': round(float(metrics['distance_km'].sum()), 3),
+        'cost': round(float(metrics['cost'].sum()), 2),
+    }
+    if metrics['vehicle'].notna().any():
+        result['vehicles'] = {str(k): int(v) for k, v in metrics['vehicle'].value_counts().items()}
+    return result
+
+
+def write_results(path, optimizer, staff_data, routes, route_info=None, fmt=None, extra=None):
+    """Write routes and metrics to ``path`` as JSON, CSV or Parquet.
+
+    JSON holds a summary plus every route with its stops; CSV and Parquet
+    hold one row per stop. Returns the summary dict (merged with ``extra``).
+    """
+    fmt = output_format(path, fmt)
+    metrics = route_metrics(optimizer, routes, route_info, staff_data)
+    stops = stops_frame(optimizer, staff_data, routes, route_info, metrics)
+    result = summary(metrics, len(staff_data))
+    result.update(extra or {})
+
+    if fmt == 'json':
+        stops, metrics = _nullable(stops), _nullable(metrics)
+        by_route = {name: group.drop(columns='route') for name, group in stops.groupby('route', sort=False)}
+        document = {'summary': result, 'routes': []}
+        for record in metrics.to_dict('records'):
+            stop_columns = [c for c in by_route[record['route']].columns if not c.startswith('route_')]
+            record['stops'] = by_route[record['route']][stop_columns].to_dict('records')
+            document['routes'].append(record)
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2, default=_json_default)
+    elif fmt == 'csv':
+        stops.to_csv(path, index=False)
+    else:
+        stops.to_parquet(path, index=False)
+    return result
+
+
+def _nullable(frame):
+    # NaN is not valid JSON
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def _json_default(value):
+    # NumPy scalars and categoricals from the roster
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
@@ -0,0 +1,85 @@
+"""Vehicle fleet definitions and per-route vehicle choice.
+
+A fleet is a sequence of ``VehicleType``s. A route of ``n`` passengers and
+``km`` kilometres can use any type that seats ``n``. It costs
+``fixed_cost + cost_per_km * km`` on that type, and always gets the
+cheapest type that fits.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+
+FLEET_COLUMNS = ('name', 'capacity', 'cost_per_km', 'fixed_cost')
+
+
+@dataclass(frozen=True)
+class VehicleType:
+    """One kind of vehicle: seats, running cost per km and cost per route"""
+
+    name: str
+    capacity: int
+    cost_per_km: float
+    fixed_cost: float = 0.0
+
+    def cost(self, km):
+        return self.fixed_cost + self.cost_per_km * km
+
+
+# Sedans, 7-seaters and 15-seat minibuses, costs in the currency of COST_PER_KM.
+# The fixed cost covers the driver and vehicle for one trip.
+DEFAULT_FLEET = (
+    VehicleType('Sedan', 4, 2.5, 15.0),
+    VehicleType('7-seater', 7, 3.0, 18.0),
+    VehicleType('Minibus', 15, 4.0, 25.0),
+)
+
+
+def single_vehicle_fleet(capacity, cost_per_km):
+    """Fleet of one vehicle type, matching MAX_PASSENGERS / COST_PER_KM"""
+    return (VehicleType('Vehicle', int(capacity), float(cost_per_km)),)
+
+
+def fleet_capacity(fleet):
+    """Seats on the largest vehicle of the fleet"""
+    return max(vehicle.capacity for vehicle in fleet)
+
+
+def cheapest_vehicle(fleet, passengers, km):
+    """``(vehicle, cost)`` of the cheapest type seating ``passengers`` over ``km``"""
+    best = None
+    for vehicle in fleet:
+        if vehicle.capacity < passengers:
+            continue
+        cost = vehicle.cost(km)
+        if best is None or cost < best[1]:
+            best = (vehicle, cost)
+    if best is None:
+        raise ValueError(f"No vehicle in the fleet seats {passengers} passengers")
+    return best
+
+
+def parse_fleet(table):
+    """Fleet from a DataFrame (or records) with FLEET_COLUMNS; fixed_cost is optional"""
+    table = pd.DataFrame(table)
+    if 'fixed_cost' not in table.columns:
+        table['fixed_cost'] = 0.0
+    missing = [column for column in FLEET_COLUMNS if column not in table.columns]
+    if missing:
+        raise ValueError(f"Fleet is missing column(s): {', '.join(missing)}")
+    table = table.dropna(subset=['name', 'capacity', 'cost_per_km'])
+
+    fleet = []
+    for row in table.itertuples(index=False):
+        vehicle = VehicleType(str(row.name), int(row.capacity), float(row.cost_per_km),
+                              float(row.fixed_cost) if pd.notna(row.fixed_cost) else 0.0)
+        if vehicle.capacity < 1 or vehicle.cost_per_km < 0 or vehicle.fixed_cost < 0:
+            raise ValueError(f"Invalid vehicle type '{vehicle.name}'")
+        fleet.append(vehicle)
+    if not fleet:
+        raise ValueError("Fleet needs at least one vehicle type")
+    return tuple(fleet)
+
+
+def fleet_table(fleet):
+    """DataFrame view of a fleet, the inverse of ``parse_fleet``"""
+    return pd.DataFrame([vars(vehicle) for vehicle in fleet], columns=list(FLEET_COLUMNS))
@@ -0,0 +1,248 @@
+"""Incremental route repair for small roster changes.
+
+Rather than re-clustering and re-routing the whole roster, only the routes
+touched by a change are repaired: removed and moved staff leave their route,
+new and moved staff are inserted at the cheapest feasible stop of a route in
+their nearest cluster (and, for multi-depot routes, of their own depot and
+shift), and only what cannot be placed is solved into new routes. Untouched
+routes keep their name, members and pickup order.
+"""
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+from ride_router.distance import DistanceMatrix
+from ride_router.multidepot import assign_depots, build_route_info, shift_labels
+from ride_router.routing import ROUTE_DTYPE, route_names
+
+# Routes of this many nearest settled staff are considered for an insertion
+NEARBY_STAFF = 16
+
+
+def apply_roster_changes(staff_data, added=None, removed_ids=None, moved=None):
+    """New roster with ``removed_ids`` dropped, ``moved`` coordinates applied
+    (rows of staff_id, latitude, longitude) and ``added`` rows appended"""
+    roster = staff_data
+    if removed_ids is not None and len(removed_ids):
+        roster = roster[~roster['staff_id'].isin(removed_ids)]
+    roster = roster.reset_index(drop=True)
+    if moved is not None and len(moved):
+        coords = moved.set_index('staff_id')[['latitude', 'longitude']]
+        rows = roster['staff_id'].isin(coords.index)
+        ids = roster.loc[rows, 'staff_id']
+        roster.loc[rows, 'latitude'] = coords.loc[ids, 'latitude'].to_numpy()
+        roster.loc[rows, 'longitude'] = coords.loc[ids, 'longitude'].to_numpy()
+    if added is not None and len(added):
+        roster = pd.concat([roster, added], ignore_index=True)
+    if not roster['staff_id'].is_unique:
+        raise ValueError("staff_id must be unique for incremental updates")
+    return roster
+
+
+def reoptimize(optimizer, staff_data, routes, added=None, removed_ids=None, moved=None,
+               route_info=None):
+    """Repair ``routes`` (as returned by ``optimize_routes``) after a roster diff.
+
+    With ``route_info`` from ``optimize_multi_depot``, arrivals only join
+    routes of their own depot and shift (their named or nearest depot and
+    their roster shift), new routes end at that depot, and the info of every
+    changed or new route is rebuilt.
+
+    Returns ``(new_staff_data, new_routes, changed, new_route_info)`` where
+    ``changed`` lists the names of routes that were modified, created or
+    removed; removed routes are the names in ``changed`` missing from
+    ``new_routes``. ``new_route_info`` is None without ``route_info``.
+    """
+    staff_ids = staff_data['staff_id'].to_numpy()
+    removed_ids = set() if removed_ids is None else set(removed_ids)
+    moved_ids = set() if moved is None else set(moved['staff_id'])
+    added_ids = [] if added is None else list(added['staff_id'])
+
+    roster = apply_roster_changes(staff_data, added, removed_ids, moved)
+    arriving = moved_ids | set(added_ids)
+    pending_ids = [sid for sid in roster['staff_id'] if sid in arriving]
+
+    # Drop leaving and moving staff from their routes, by staff_id
+    leaving = removed_ids | moved_ids
+    route_ids = {}
+    changed = set()
+    for name, route in routes.items():
+        ids = [sid for sid in staff_ids[route] if sid not in leaving]
+        if len(ids) != len(route):
+            changed.add(name)
+        if ids:
+            route_ids[name] = ids
+
+    position = pd.Index(roster['staff_id'])
+    pending = position.get_indexer(pending_ids)
+    lats = roster['latitude'].to_numpy(dtype=np.float64)
+    lons = roster['longitude'].to_numpy(dtype=np.float64)
+    depots = optimizer.depots
+    method = optimizer.DISTANCE_METHOD
+    network = getattr(optimizer, 'road_network', None)
+    members = {name: list(position.get_indexer(ids)) for name, ids in route_ids.items()}
+    route_of = {pos: name for name, stops in members.items() for pos in stops}
+    settled = np.fromiter(route_of, dtype=np.intp)
+
+    # Depot and shift of every row: settled staff keep their route's depot,
+    # arrivals take their named or nearest one as in solve_multi_depot
+    depot_of = np.zeros(len(roster), dtype=np.intp)
+    shifts = np.full(len(roster), '', dtype=object)
+    if route_info is not None:
+        shifts = shift_labels(roster)
+        for name, stops in members.items():
+            if name in route_info:
+                depot_of[stops] = route_info[name]['depot_index']
+        if len(pending):
+            arrival_distances = DistanceMatrix(lats[pending], lons[pending], depots,
+                                               method=method, network=network)
+            depot_of[pending] = assign_depots(roster.iloc[pending], arrival_distances, depots)
+    groups = pd.MultiIndex.from_arrays([depot_of, shifts]).factorize()[0]
+
+    if 'cluster' in roster:
+        labels = roster['cluster'].fillna(-1).to_numpy().astype(int)
+    else:
+        labels = np.zeros(len(roster), dtype=int)
+    labels[pending] = _nearest_cluster(roster, labels, pending, groups)
+    roster['cluster'] = labels
+
+    # Cheapest insertion into nearby routes of the same depot, shift and cluster
+    unplaced = []
+    if len(pending) and len(settled):
+        coords = np.radians(np.column_stack([lats, lons]))
+        candidates = [[] for _ in pending]
+        for group in np.unique(groups[pending]):
+            arrivals = np.flatnonzero(groups[pending] == group)
+            peers = settled[groups[settled] == group]
+            if len(peers) == 0:
+                continue
+            tree = BallTree(coords[peers], metric='haversine')
+            _, nearby = tree.query(coords[pending[arrivals]], k=min(NEARBY_STAFF, len(peers)))
+            for i, row in zip(arrivals, nearby):
+                candidates[i] = list(dict.fromkeys(route_of[p] for p in peers[row]))
+
+        # Distances only among arrivals and the members of their candidate routes
+        local = np.unique(np.concatenate(
+            [pending] + [members[name] for names in candidates for name in names]
+        ).astype(np.intp))
+        distances = DistanceMatrix(lats[local], lons[local], depots, method=method, network=network)
+
+        def length(stops):
+            return distances.route_length(np.searchsorted(local, stops), depot=depot_of[stops[0]])
+
+        # Place the furthest arrivals first, they constrain routes the most
+        to_depot = distances.to_depots[np.searchsorted(local, pending), depot_of[pending]]
+        for i in np.argsort(-to_depot):
+            pos = pending[i]
+            best = None
+            for name in candidates[i]:
+                stops = members[name]
+                if len(stops) >= optimizer.MAX_PASSENGERS or labels[stops[0]] != labels[pos]:
+                    continue
+                base = length(stops)
+                for at in range(len(stops) + 1):
+                    delta = length(stops[:at] + [pos] + stops[at:]) - base
+                    if best is None or delta < best[0]:
+                        best = (delta, name, at)
+            if best is None:
+                unplaced.append(pos)
+                continue
+            _, name, at = best
+            members[name].insert(at, pos)
+            changed.add(name)
+    else:
+        unplaced.extend(pending)
+
+    # Routes that fell below the minimum are re-solved with whatever is unplaced
+    for name in sorted(changed):
+        if name in members and len(members[name]) < optimizer.MIN_PASSENGERS:
+            unplaced.extend(members.pop(name))
+
+    new_routes = {name: np.asarray(stops, dtype=ROUTE_DTYPE) for name, stops in members.items()}
+    if unplaced:
+        unplaced = np.asarray(unplaced, dtype=np.intp)
+        # One time budget for the whole update, split by group size
+        deadline = None
+        if optimizer.solver.time_limit is not None:
+            deadline = time.perf_counter() + optimizer.solver.time_limit
+        unsolved = len(unplaced)
+        solved = []
+        keys = pd.DataFrame({'depot': depot_of[unplaced], 'shift': shifts[unplaced],
+                             'cluster': labels[unplaced]})
+        by_group = keys.groupby(['depot', 'shift', 'cluster'], sort=False).indices
+        for (depot, _, _), rows in by_group.items():
+            cluster_staff = unplaced[rows]
+            distances = DistanceMatrix(lats[cluster_staff], lons[cluster_staff], depots[depot],
+                                       method=method, network=network)
+            time_limit = None
+            if deadline is not None:
+                time_limit = max(0.0, deadline - time.perf_counter()) * len(cluster_staff) / unsolved
+            unsolved -= len(cluster_staff)
+            cluster_routes, leftover = optimizer.solver.solve(
+                distances, np.arange(len(cluster_staff)), optimizer.MIN_PASSENGERS,
+                optimizer.MAX_PASSENGERS, time_limit=time_limit
+            )
+            solved.extend(cluster_staff[route] for route in cluster_routes)
+            if len(leftover):
+                # Too few to meet the minimum on their own, they still need a ride
+                solved.append(cluster_staff[leftover])
+        start = _next_route_number(new_routes)
+        for name, route in zip(route_names(len(solved), start=start), solved):
+            new_routes[name] = np.asarray(route, dtype=ROUTE_DTYPE)
+            changed.add(name)
+
+    new_route_info = None
+    if route_info is not None:
+        new_route_info = _rebuild_route_info(optimizer, new_routes, route_info, changed,
+                                             lats, lons, depot_of, shifts)
+    return roster, new_routes, sorted(changed, key=_route_number), new_route_info
+
+
+def _rebuild_route_info(optimizer, routes, route_info, changed, lats, lons, depot_of, shifts):
+    """``route_info`` for ``routes``: kept for untouched routes, rebuilt for changed ones"""
+    rebuilt = [name for name in routes if name in changed or name not in route_info]
+    info = {}
+    if rebuilt:
+        local = np.unique(np.concatenate([routes[name] for name in rebuilt]).astype(np.intp))
+        distances = DistanceMatrix(lats[local], lons[local], optimizer.depots,
+                                   method=optimizer.DISTANCE_METHOD,
+                                   network=getattr(optimizer, 'road_network', None))
+        for name in rebuilt:
+            route = routes[name]
+            info[name] = build_route_info(optimizer, distances, np.searchsorted(local, route),
+                                          optimizer.depots, int(depot_of[route[0]]),
+                                          shifts[route[0]])
+    return {name: info.get(name, route_info.get(name)) for name in routes}
+
+
+def _nearest_cluster(roster, labels, pending, groups):
+    """Cluster of the closest settled staff member of the same group for each pending row"""
+    result = labels[pending].copy()
+    settled = np.setdiff1d(np.arange(len(roster)), pending)
+    if len(pending) == 0:
+        return result
+    if len(settled) == 0:
+        return np.zeros(len(pending), dtype=labels.dtype)
+    coords = np.radians(roster[['latitude', 'longitude']].to_numpy(dtype=np.float64))
+    for group in np.unique(groups[pending]):
+        rows = np.flatnonzero(groups[pending] == group)
+        peers = settled[groups[settled] == group]
+        if len(peers) == 0:
+            # Nobody else in this depot and shift; any nearby cluster will do
+            peers = settled
+        tree = BallTree(coords[peers], metric='haversine')
+        _, nearest = tree.query(coords[pending[rows]], k=1)
+        result[rows] = labels[peers[nearest[:, 0]]]
+    return result
+
+
+def _route_number(name):
+    match = re.search(r'(\d+)$', name)
+    return int(match.group(1)) if match else 0
+
+
+def _next_route_number(routes):
+    return max((_route_number(name) for name in routes), default=0) + 1
@@ -0,0 +1,185 @@
+"""Streaming roster ingestion with validation.
+
+CSV files are read in chunks; Parquet and Arrow IPC/Feather files are read
+batch by batch through pyarrow (memory-mapped for paths, zero-copy over the
+upload buffer otherwise). Every chunk is validated on its own, so bad rows
+are dropped before the next chunk is read and only the kept rows stay in
+memory. Coordinates are stored as float32 (sub-metre precision at Accra's
+latitude) and addresses as a categorical.
+"""
+import io
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+REQUIRED_COLUMNS = ('latitude', 'longitude')
+COORD_DTYPE = np.float32
+CATEGORY_COLUMNS = ('address',)
+DEFAULT_CHUNKSIZE = 100_000
+
+FORMATS = {
+    '.csv': 'csv',
+    '.txt': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+
+@dataclass
+class IngestReport:
+    """Row counts for one ingested roster"""
+
+    source_format: str
+    rows_read: int = 0
+    rows_kept: int = 0
+    rejected: dict = field(default_factory=dict)
+
+    @property
+    def rows_rejected(self):
+        return self.rows_read - self.rows_kept
+
+    def reject(self, reason, count):
+        if count:
+            self.rejected[reason] = self.rejected.get(reason, 0) + int(count)
+
+    def summary(self):
+        text = f"{self.rows_kept:,} of {self.rows_read:,} rows loaded"
+        if self.rejected:
+            reasons = ', '.join(f"{count:,} {reason}" for reason, count in self.rejected.items())
+            text += f" ({reasons} rejected)"
+        return text
+
+
+def detect_format(name):
+    """Roster format from a file name or path"""
+    ext = os.path.splitext(str(name).lower())[1]
+    try:
+        return FORMATS[ext]
+    except KeyError:
+        raise ValueError(f"Unsupported roster file type '{ext}', expected one of {sorted(FORMATS)}") from None
+
+
+def read_roster(source, name=None, chunksize=DEFAULT_CHUNKSIZE, required=REQUIRED_COLUMNS):
+    """Read and validate a staff roster.
+
+    ``source`` is a path or a file-like object (such as a Streamlit upload);
+    ``name`` overrides the file name used to detect the format. ``required``
+    lists the columns every chunk must have; pass ``staff_id`` too when ids
+    must not be made up. Returns ``(staff_data, IngestReport)``.
+    """
+    if name is None:
+        name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+    source_format = detect_format(name)
+    report = IngestReport(source_format)
+
+    if source_format == 'csv':
+        chunks = _csv_chunks(source, chunksize)
+    else:
+        chunks = _arrow_chunks(source, source_format, chunksize)
+
+    kept = []
+    for chunk in chunks:
+        report.rows_read += len(chunk)
+        chunk = validate_chunk(chunk, report, required)
+        if len(chunk):
+            kept.append(chunk)
+
+    staff_data = _concat(kept)
+    staff_data = _fill_defaults(staff_data, report)
+    report.rows_kept = len(staff_data)
+    return staff_data, report
+
+
+def validate_chunk(chunk, report, required=REQUIRED_COLUMNS):
+    """Coerce coordinates and drop rows that cannot be routed"""
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Roster is missing required column(s): {', '.join(missing)}")
+
+    lat = pd.to_numeric(chunk['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(chunk['longitude'], errors='coerce').to_numpy(dtype=np.float64)
+
+    unparsable = ~(np.isfinite(lat) & np.isfinite(lon))
+    out_of_range = ~unparsable & ((np.abs(lat) > 90) | (np.abs(lon) > 180))
+    # (0, 0) is what blank cells become in many HR exports
+    null_island = ~unparsable & (lat == 0) & (lon == 0)
+    report.reject('missing or non-numeric coordinates', unparsable.sum())
+    report.reject('out-of-range coordinates', out_of_range.sum())
+    report.reject('(0, 0) coordinates', null_island.sum())
+
+    keep = ~(unparsable | out_of_range | null_island)
+    chunk = chunk.loc[keep].copy() if not keep.all() else chunk
+    chunk['latitude'] = lat[keep].astype(COORD_DTYPE)
+    chunk['longitude'] = lon[keep].astype(COORD_DTYPE)
+    for column in CATEGORY_COLUMNS:
+        if column in chunk.columns and not isinstance(chunk[column].dtype, pd.CategoricalDtype):
+            chunk[column] = chunk[column].astype('category')
+    return chunk
+
+
+def _csv_chunks(source, chunksize):
+    # Coordinates are parsed in validate_chunk so a stray string cannot
+    # abort the whole read; only the categorical hint is given up front.
+    dtype = {column: 'category' for column in CATEGORY_COLUMNS}
+    with pd.read_csv(source, chunksize=chunksize, dtype=dtype) as reader:
+        yield from reader
+
+
+def _arrow_chunks(source, source_format, chunksize):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    if isinstance(source, (str, os.PathLike)):
+        stream = pa.memory_map(str(source), 'r')
+    else:
+        # Wrap the upload's own buffer rather than copying its bytes
+        buffer = source.getbuffer() if isinstance(source, io.BytesIO) else source.read()
+        stream = pa.BufferReader(pa.py_buffer(buffer))
+
+    with stream:
+        if source_format == 'parquet':
+            for batch in pq.ParquetFile(stream).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+        else:
+            reader = ipc.open_file(stream)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas()
+
+
+def _concat(chunks):
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=COORD_DTYPE) for column in REQUIRED_COLUMNS})
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+
+    # Chunks carry their own categories; unify them so the result stays categorical
+    categories = {}
+    for column in CATEGORY_COLUMNS:
+        if column in chunks[0].columns:
+            categories[column] = union_categoricals([chunk[column] for chunk in chunks])
+    staff_data = pd.concat(chunks, ignore_index=True)
+    for column, values in categories.items():
+        staff_data[column] = values
+    return staff_data
+
+
+def _fill_defaults(staff_data, report):
+    """Columns the optimizer and map expect, when the roster does not have them"""
+    if 'staff_id' not in staff_data.columns:
+        staff_data.insert(0, 'staff_id', np.arange(1, len(staff_data) + 1))
+    elif not staff_data['staff_id'].is_unique:
+        duplicated = staff_data['staff_id'].duplicated()
+        report.reject('duplicate staff_id', duplicated.sum())
+        staff_data = staff_data.loc[~duplicated].reset_index(drop=True)
+    if 'name' not in staff_data.columns:
+        staff_data['name'] = 'Employee ' + staff_data['staff_id'].astype(str)
+    if 'address' not in staff_data.columns:
+        staff_data['address'] = pd.Categorical([''] * len(staff_data))
+    return staff_data
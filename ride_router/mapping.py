@@ -0,0 +1,68 @@
+"""GeoJSON builders for the lightweight map rendering modes.
+
+Instead of one folium object (and one pre-rendered HTML popup) per staff
+member, routes and stops are emitted as two GeoJSON layers whose popups are
+rendered in the browser from feature properties when clicked.
+"""
+ROUTE_COLORS = ['blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige',
+                'darkblue', 'darkgreen', 'cadetblue']
+
+MAP_MODES = ('auto', 'detailed', 'light', 'lines')
+
+
+def route_color(route_idx):
+    return ROUTE_COLORS[route_idx % len(ROUTE_COLORS)]
+
+
+def route_features(routes, lats, lons, ends, metrics):
+    """FeatureCollection with one LineString per route, ending at its depot.
+
+    ``ends`` and ``metrics`` map route name to the depot (a lat/lon dict) and
+    to ``(distance_km, cost)``.
+    """
+    features = []
+    for route_idx, (route_name, route) in enumerate(routes.items()):
+        coordinates = [[float(lons[pos]), float(lats[pos])] for pos in route]
+        coordinates.append([ends[route_name]['lon'], ends[route_name]['lat']])
+        distance, cost = metrics[route_name]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'properties': {
+                'route': route_name,
+                'passengers': len(route),
+                'distance_km': round(float(distance), 2),
+                'cost': round(float(cost), 2),
+                'color': route_color(route_idx),
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def stop_features(routes, lats, lons, names, addresses, to_office):
+    """FeatureCollection with one Point per assigned staff member
+
+    ``to_office`` holds each staff position's distance to its route's depot.
+    """
+    features = []
+    for route_idx, (route_name, route) in enumerate(routes.items()):
+        color = route_color(route_idx)
+        for stop, pos in enumerate(route, 1):
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [float(lons[pos]), float(lats[pos])]},
+                'properties': {
+                    'name': str(names[pos]),
+                    'address': str(addresses[pos]),
+                    'route': route_name,
+                    'stop': stop,
+                    'distance_to_office': round(float(to_office[pos]), 2),
+                    'color': color,
+                },
+            })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def feature_style(feature):
+    color = feature['properties']['color']
+    return {'color': color, 'fillColor': color, 'weight': 2, 'opacity': 0.8, 'fillOpacity': 0.7}
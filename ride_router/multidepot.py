@@ -0,0 +1,155 @@
+"""Multi-depot, multi-shift route optimization.
+
+All depots share one DistanceMatrix over the roster, so staff-to-staff and
+staff-to-depot distances are computed once however many offices there are.
+Each staff member is assigned to their ``depot`` column value when given,
+otherwise to the nearest depot. Vehicles are then built per
+(depot, shift, cluster) group with the optimizer's solver.
+
+Shifts come from an optional ``shift`` column of ``HH:MM`` start times.
+Each route gets a pickup timetable so its vehicle reaches the depot
+``ARRIVAL_BUFFER_MINUTES`` before the shift starts. A route whose first
+passenger would ride longer than ``MAX_RIDE_MINUTES`` is split.
+"""
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ride_router.routing import ROUTE_DTYPE, route_names
+
+SHIFT_COLUMN = 'shift'
+DEPOT_COLUMN = 'depot'
+
+
+def parse_depots(text):
+    """Depot dicts (name, lat, lon) from 'name, latitude, longitude' lines"""
+    depots = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split(',')]
+        if len(parts) != 3:
+            raise ValueError(f"Expected 'name, latitude, longitude', got '{line}'")
+        try:
+            depots.append({'name': parts[0], 'lat': float(parts[1]), 'lon': float(parts[2])})
+        except ValueError:
+            raise ValueError(f"Invalid depot coordinates in '{line}'")
+    return depots
+
+
+def shift_labels(staff_data):
+    """Shift of every staff row as a string, '' where the roster gives none"""
+    if SHIFT_COLUMN in staff_data.columns:
+        return staff_data[SHIFT_COLUMN].fillna('').astype(str).to_numpy()
+    return np.full(len(staff_data), '', dtype=object)
+
+
+def assign_depots(staff_data, distances, depots, depot_column=DEPOT_COLUMN):
+    """Depot index for every staff row: the named one if given, else the nearest"""
+    nearest = distances.to_depots.argmin(axis=1)
+    if depot_column not in staff_data.columns:
+        return nearest
+    index = {depot['name']: i for i, depot in enumerate(depots)}
+    named = staff_data[depot_column].map(index).to_numpy(dtype=np.float64)
+    return np.where(np.isnan(named), nearest, named).astype(np.intp)
+
+
+def solve_multi_depot(optimizer, staff_data, depots):
+    """Route every (depot, shift) group in one pass.
+
+    Returns ``(routes, route_info)``; ``routes`` has the usual compact form and
+    ``route_info`` maps each route name to its depot, shift, ride minutes and
+    pickup times.
+    """
+    distances = optimizer.distance_cache.get(
+        staff_data, depots, method=optimizer.DISTANCE_METHOD,
+        network=optimizer.road_network
+    )
+    depot_of = assign_depots(staff_data, distances, depots)
+    shifts = shift_labels(staff_data)
+    if 'cluster' in staff_data.columns:
+        labels = staff_data['cluster'].to_numpy()
+    else:
+        labels = np.zeros(len(staff_data), dtype=int)
+
+    groups = pd.DataFrame({'depot': depot_of, 'shift': shifts, 'cluster': labels})
+    # One time budget for the whole roster, shared across groups and clusters
+    # in proportion to their size as in optimize_routes
+    deadline = None
+    if optimizer.solver.time_limit is not None:
+        deadline = time.perf_counter() + optimizer.solver.time_limit
+    unsolved = len(groups)
+    routes, info = [], []
+    for (depot, shift), group in groups.groupby(['depot', 'shift'], sort=True):
+        group_routes = []
+        for _, cluster in group.groupby('cluster', sort=False):
+            members = cluster.index.to_numpy()
+            sub = distances.subset(members, depot=depot)
+            time_limit = None
+            if deadline is not None:
+                time_limit = max(0.0, deadline - time.perf_counter()) * len(members) / unsolved
+            unsolved -= len(members)
+            cluster_routes, leftover = optimizer.solver.solve(
+                sub, np.arange(len(members)), optimizer.MIN_PASSENGERS,
+                optimizer.MAX_PASSENGERS, time_limit=time_limit
+            )
+            group_routes.extend(list(members[route]) for route in cluster_routes)
+            # Leftovers can only ride with staff of the same depot and shift
+            for position in members[leftover]:
+                for route in group_routes:
+                    if len(route) < optimizer.MAX_PASSENGERS:
+                        route.append(position)
+                        break
+                else:
+                    group_routes.append([position])
+
+        for route in group_routes:
+            for part in _split_long_ride(optimizer, distances, route, depot):
+                routes.append(np.asarray(part, dtype=ROUTE_DTYPE))
+                info.append(build_route_info(optimizer, distances, part, depots, depot, shift))
+
+    names = route_names(len(routes))
+    return dict(zip(names, routes)), dict(zip(names, info))
+
+
+def ride_minutes(optimizer, distances, route, depot):
+    """Minutes from each stop to the depot along the route"""
+    stops = list(route) + [distances.office + depot]
+    legs = np.array([distances.between([a], [b])[0, 0] for a, b in zip(stops[:-1], stops[1:])])
+    remaining_km = legs[::-1].cumsum()[::-1]
+    return remaining_km / optimizer.AVERAGE_SPEED_KMH * 60
+
+
+def _split_long_ride(optimizer, distances, route, depot):
+    """Halve a route until its first passenger's ride fits MAX_RIDE_MINUTES"""
+    if len(route) < 2 or ride_minutes(optimizer, distances, route, depot)[0] <= optimizer.MAX_RIDE_MINUTES:
+        return [route]
+    middle = len(route) // 2
+    return (_split_long_ride(optimizer, distances, route[:middle], depot)
+            + _split_long_ride(optimizer, distances, route[middle:], depot))
+
+
+def build_route_info(optimizer, distances, route, depots, depot, shift):
+    """Depot, shift, longest ride and pickup times of a route ending at ``depot``"""
+    minutes = ride_minutes(optimizer, distances, route, depot)
+    pickups = []
+    start = _parse_shift(shift)
+    if start is not None:
+        arrival = start - timedelta(minutes=optimizer.ARRIVAL_BUFFER_MINUTES)
+        pickups = [(arrival - timedelta(minutes=float(m))).strftime('%H:%M') for m in minutes]
+    return {
+        'depot': depots[depot]['name'],
+        'depot_index': int(depot),
+        'shift': shift or None,
+        'ride_minutes': round(float(minutes[0]), 1),
+        'pickup_times': pickups,
+    }
+
+
+def _parse_shift(shift):
+    try:
+        return datetime.strptime(str(shift).strip(), '%H:%M')
+    except ValueError:
+        return None
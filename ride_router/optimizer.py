@@ -0,0 +1,492 @@
+"""Staff transport optimizer, usable without Streamlit.
+
+``StaffTransportOptimizer`` clusters a roster, builds routes to the office (or
+several depots) and costs them. Heavy optional dependencies load on first
+use: scikit-learn when clustering and folium when drawing a map, so batch
+jobs that only route and export never import a plotting stack.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from ride_router.cache import DistanceMatrixCache, ResultCache
+from ride_router.clustering import auto_eps, project_km, split_large_clusters
+from ride_router.fleet import cheapest_vehicle, fleet_capacity
+from ride_router.mapping import feature_style, route_color, route_features, stop_features
+from ride_router.multidepot import solve_multi_depot
+from ride_router.parallel import PARALLEL_MIN_STAFF, solve_clusters
+from ride_router.routing import ROUTE_DTYPE, route_names
+from ride_router.solvers import get_solver
+
+try:
+    from instrumentation import count, timed
+except ImportError:
+    # The shared metrics module lives at the app root; the package runs without it
+    def count(name, value=1, registry=None, **labels):
+        pass
+
+    def timed(stage=None, registry=None, **labels):
+        return lambda func: func
+
+
+class StaffTransportOptimizer:
+    def __init__(self, distance_cache=None, solver='greedy', result_cache=None):
+        self.office_location = {
+            'lat': 5.582636441579255,
+            'lon': -0.143551646497661
+        }
+        self.extra_depots = []  # Further offices as {'name', 'lat', 'lon'} dicts
+        self.fleet = None  # VehicleTypes to cost routes on; None runs every route at COST_PER_KM
+        self.MAX_PASSENGERS = 4
+        self.MIN_PASSENGERS = 3  # Minimum passengers per car
+        self.COST_PER_KM = 2.5  # Cost per kilometer
+        self.DISTANCE_METHOD = 'geodesic'  # 'geodesic' (WGS-84), 'haversine' (faster) or 'road'
+        self.road_network = None  # RoadNetwork used when DISTANCE_METHOD is 'road'
+        self.OUTLIER_ASSIGNMENT = 'nearest'  # 'nearest' clustered neighbour or 'mean' distance to cluster
+        self.CLUSTER_SIZE_FACTOR = 25  # Split clusters above this many full vehicles, None to keep them whole
+        self.eps_km = None  # Cluster radius used by the last create_clusters call
+        self.N_JOBS = 1  # Worker processes for per-cluster solving, None for one per CPU
+        self.MAP_LIGHT_THRESHOLD = 500  # Above this many staff, render stops as one GeoJSON layer
+        self.MAP_LINES_ONLY_THRESHOLD = 5000  # Above this many staff, draw route lines only
+        self.MAX_RIDE_MINUTES = 75  # Longest ride for the first passenger picked up
+        self.AVERAGE_SPEED_KMH = 25  # Used to turn route km into ride and pickup times
+        self.ARRIVAL_BUFFER_MINUTES = 10  # Arrive this long before the shift starts
+        self.distance_cache = distance_cache if distance_cache is not None else DistanceMatrixCache()
+        self.distances = None  # DistanceMatrix of the roster last prepared
+        self.solver = get_solver(solver) if isinstance(solver, str) else solver
+        self.result_cache = result_cache
+        if getattr(self.solver, 'fleet', None) is not None:
+            self.use_fleet(self.solver.fleet)
+
+    @property
+    def depots(self):
+        """The office followed by any extra depots"""
+        return [dict(name='Office', **self.office_location)] + list(self.extra_depots)
+
+    @timed('prepare_distances')
+    def prepare_distances(self, staff_data):
+        """Fetch (or build once) the staff + depots distance matrix for a roster"""
+        self.distances = self.distance_cache.get(
+            staff_data, self.depots, method=self.DISTANCE_METHOD,
+            network=self.road_network
+        )
+        return self.distances
+
+    def load_sample_data(self):
+        """Load sample staff location data for Accra region"""
+        return pd.DataFrame({
+            'staff_id': range(1, 21),
+            'name': [f'Employee {i}' for i in range(1, 21)],
+            'latitude': np.random.uniform(5.5526, 5.6126, 20),
+            'longitude': np.random.uniform(-0.1735, -0.1135, 20),
+            'address': [
+                'Adabraka', 'Osu', 'Cantonments', 'Airport Residential',
+                'East Legon', 'Spintex', 'Tema', 'Teshie', 'Labadi',
+                'Labone', 'Ridge', 'Roman Ridge', 'Dzorwulu', 'Abelemkpe',
+                'North Kaneshie', 'Dansoman', 'Mamprobi', 'Chorkor',
+                'Abeka', 'Achimota'
+            ]
+        })
+
+    @timed('create_clusters')
+    def create_clusters(self, staff_data, eps_km=None):
+        """Create clusters based on staff locations with minimum size constraint
+        
+        DBSCAN runs on positions projected to km; ``eps_km=None`` picks the
+        radius from the roster's k-distance curve. Clusters above
+        ``max_cluster_size`` staff are then split.
+        """
+        if staff_data is None or len(staff_data) == 0:
+            return None
+        
+        from sklearn.cluster import DBSCAN
+        
+        xy = project_km(staff_data['latitude'].to_numpy(), staff_data['longitude'].to_numpy())
+        if eps_km is None:
+            eps_km = auto_eps(xy, self.MIN_PASSENGERS)
+        self.eps_km = eps_km
+        
+        # Adjust min_samples to ensure minimum cluster size
+        labels = DBSCAN(eps=eps_km, min_samples=self.MIN_PASSENGERS).fit(xy).labels_.copy()
+        
+        # Handle outliers (points labeled as -1)
+        outlier_mask = labels == -1
+        if outlier_mask.all():
+            labels[:] = 0
+        elif outlier_mask.any():
+            labels[outlier_mask] = self._assign_outliers(staff_data, labels, outlier_mask)
+        
+        if self.max_cluster_size:
+            labels = split_large_clusters(xy, labels, self.max_cluster_size)
+        staff_data['cluster'] = labels
+        return staff_data
+
+    @property
+    def max_cluster_size(self):
+        """Largest cluster handed to the solver, None for no limit"""
+        if not self.CLUSTER_SIZE_FACTOR:
+            return None
+        return self.CLUSTER_SIZE_FACTOR * self.MAX_PASSENGERS
+
+    def optimize(self, staff_data, eps_km=None):
+        """Cluster and route a roster, reusing a cached result when one exists
+        
+        Returns (staff data with a 'cluster' column, routes).
+        """
+        key = None
+        if self.result_cache is not None:
+            key = ResultCache.make_key(
+                staff_data,
+                eps_km=None if eps_km is None else float(eps_km),
+                cluster_size_factor=self.CLUSTER_SIZE_FACTOR,
+                max_passengers=self.MAX_PASSENGERS,
+                min_passengers=self.MIN_PASSENGERS,
+                cost_per_km=self.COST_PER_KM,
+                distance_method=self.DISTANCE_METHOD,
+                road_network=self.road_network.fingerprint if self.road_network is not None else None,
+                outlier_assignment=self.OUTLIER_ASSIGNMENT,
+                fleet=self.fleet,
+                office=(self.office_location['lat'], self.office_location['lon']),
+                solver=(self.solver.name, sorted(vars(self.solver).items())),
+            )
+            cached = self.result_cache.get(key)
+            count('result_cache_lookups', result='miss' if cached is None else 'hit')
+            if cached is not None:
+                labels, routes = cached
+                staff_data['cluster'] = labels
+                return staff_data, routes
+        
+        clustered_data = self.create_clusters(staff_data, eps_km)
+        routes = self.optimize_routes(clustered_data)
+        if key is not None:
+            self.result_cache.put(key, clustered_data['cluster'].to_numpy(), routes)
+        return clustered_data, routes
+
+    def _assign_outliers(self, staff_data, labels, outlier_mask):
+        """Cluster labels for outlier rows, chosen in one batched query"""
+        clustered = np.flatnonzero(~outlier_mask)
+        outliers = np.flatnonzero(outlier_mask)
+        
+        if self.OUTLIER_ASSIGNMENT == 'nearest':
+            # Label of the closest clustered staff member, via a haversine BallTree
+            from sklearn.neighbors import BallTree
+            coords = np.radians(staff_data[['latitude', 'longitude']].to_numpy(dtype=np.float64))
+            tree = BallTree(coords[clustered], metric='haversine')
+            _, nearest = tree.query(coords[outliers], k=1)
+            return labels[clustered[nearest[:, 0]]]
+        
+        if self.OUTLIER_ASSIGNMENT == 'mean':
+            # Cluster with the smallest mean distance, summed per cluster with reduceat
+            distances = self.prepare_distances(staff_data)
+            order = clustered[np.argsort(labels[clustered], kind='stable')]
+            cluster_ids, starts, sizes = np.unique(labels[order], return_index=True, return_counts=True)
+            assigned = np.empty(len(outliers), dtype=labels.dtype)
+            step = max(1, (1 << 20) // len(order))
+            for start in range(0, len(outliers), step):
+                block = outliers[start:start + step]
+                sums = np.add.reduceat(distances.between(block, order), starts, axis=1)
+                assigned[start:start + step] = cluster_ids[(sums / sizes).argmin(axis=1)]
+            return assigned
+        
+        raise ValueError(f"Unknown outlier assignment '{self.OUTLIER_ASSIGNMENT}'")
+
+    @timed('optimize_routes')
+    def optimize_routes(self, staff_data):
+        """Optimize routes with capacity and cost constraints
+        
+        Returns {route name: array of staff row positions in pickup order}.
+        """
+        distances = self.prepare_distances(staff_data)
+        labels = staff_data['cluster'].to_numpy()
+        clusters = [np.flatnonzero(labels == cluster_id) for cluster_id in pd.unique(labels)]
+        
+        if self._use_process_pool(clusters):
+            solved = solve_clusters(
+                self.solver, distances, clusters, self.MIN_PASSENGERS, self.MAX_PASSENGERS,
+                time_limit=self.solver.time_limit, max_workers=self.N_JOBS
+            )
+        else:
+            solved = self._solve_serial(distances, clusters)
+        
+        routes = []
+        for cluster_routes, leftover in solved:
+            routes.extend(list(route) for route in cluster_routes)
+            
+            # Handle remaining staff by adding to existing routes if possible
+            for position in leftover:
+                for route in routes:
+                    if len(route) < self.MAX_PASSENGERS:
+                        route.append(position)
+                        break
+        
+        return {
+            name: np.asarray(route, dtype=ROUTE_DTYPE)
+            for name, route in zip(route_names(len(routes)), routes)
+        }
+
+    def _use_process_pool(self, clusters):
+        if self.N_JOBS == 1 or len(clusters) < 2:
+            return False
+        return sum(len(members) for members in clusters) >= PARALLEL_MIN_STAFF
+
+    def _solve_serial(self, distances, clusters):
+        """Solve clusters one by one, yielding (routes, leftover) per cluster"""
+        # Share the solver's time budget across clusters in proportion to their size
+        deadline = None
+        if self.solver.time_limit is not None:
+            deadline = time.perf_counter() + self.solver.time_limit
+        unsolved = sum(len(members) for members in clusters)
+        
+        for members in clusters:
+            time_limit = None
+            if deadline is not None:
+                time_limit = max(0.0, deadline - time.perf_counter()) * len(members) / unsolved
+            unsolved -= len(members)
+            
+            yield self.solver.solve(
+                distances, members, self.MIN_PASSENGERS, self.MAX_PASSENGERS,
+                time_limit=time_limit
+            )
+
+    @timed('update_routes')
+    def update_routes(self, staff_data, routes, added=None, removed_ids=None, moved=None,
+                      route_info=None):
+        """Repair existing routes after roster changes instead of re-optimizing
+        
+        Pass ``route_info`` for routes from ``optimize_multi_depot`` so changes
+        stay within each depot and shift.
+        
+        Returns (new staff data, new routes, names of changed or removed routes,
+        new route info or None).
+        """
+        from ride_router.incremental import reoptimize
+        
+        return reoptimize(self, staff_data, routes, added=added, removed_ids=removed_ids, moved=moved,
+                          route_info=route_info)
+
+    @timed('optimize_multi_depot')
+    def optimize_multi_depot(self, staff_data, eps_km=None):
+        """Cluster once, then route every depot and shift in a single pass
+        
+        Returns (staff data with a 'cluster' column, routes, route info).
+        """
+        clustered_data = self.create_clusters(staff_data, eps_km)
+        self.prepare_distances(clustered_data)
+        routes, route_info = solve_multi_depot(self, clustered_data, self.depots)
+        return clustered_data, routes, route_info
+
+    def _distances_for(self, staff_data, distances=None):
+        """Distance matrix of ``staff_data``, or of the roster last prepared when None.
+        
+        The lookup goes by roster content through the cache, so a roster that
+        changed since the last call (even at the same size) is never served
+        stale distances. Hashing the roster costs about a millisecond per 30k
+        rows, so loops over many routes resolve the matrix once with
+        ``prepare_distances`` and pass it as ``distances``.
+        """
+        if distances is not None:
+            return distances
+        if staff_data is not None:
+            return self.prepare_distances(staff_data)
+        if self.distances is None:
+            raise ValueError("No roster prepared; pass staff_data or call prepare_distances first")
+        return self.distances
+
+    def route_details(self, staff_data, route, depot=0, distances=None):
+        """Staff rows of a route in pickup order, with their distance to the office"""
+        distances = self._distances_for(staff_data, distances)
+        details = staff_data.iloc[route].copy()
+        details['distance_to_office'] = distances.to_depots[route, depot]
+        return details
+
+    def use_fleet(self, fleet):
+        """Cost routes on a mixed fleet, seating up to its largest vehicle"""
+        self.fleet = tuple(fleet)
+        self.MAX_PASSENGERS = fleet_capacity(self.fleet)
+
+    def calculate_route_metrics(self, route, depot=0, staff_data=None, distances=None):
+        """Calculate total distance and cost for a route of staff positions in ``staff_data``"""
+        if len(route) == 0:
+            return 0, 0
+        
+        total_distance = self._distances_for(staff_data, distances).route_length(route, depot=depot)
+        if self.fleet is not None:
+            return total_distance, cheapest_vehicle(self.fleet, len(route), total_distance)[1]
+        return total_distance, total_distance * self.COST_PER_KM
+
+    def route_vehicle(self, route, depot=0, staff_data=None, distances=None):
+        """Cheapest vehicle type of the fleet for a route, None without a fleet"""
+        if self.fleet is None:
+            return None
+        total_distance = self._distances_for(staff_data, distances).route_length(route, depot=depot)
+        return cheapest_vehicle(self.fleet, len(route), total_distance)[0]
+
+    def fleet_summary(self, routes, route_info=None, staff_data=None, distances=None):
+        """Vehicles, passengers, km and cost per vehicle type for a set of routes"""
+        # Look the roster up once; the per-route calls below reuse it
+        distances = self._distances_for(staff_data, distances)
+        rows = []
+        for name, route in routes.items():
+            depot = route_info[name]['depot_index'] if route_info and name in route_info else 0
+            total_distance, total_cost = self.calculate_route_metrics(route, depot, distances=distances)
+            vehicle = self.route_vehicle(route, depot, distances=distances)
+            rows.append({
+                'vehicle': vehicle.name if vehicle is not None else 'Vehicle',
+                'passengers': len(route),
+                'distance_km': total_distance,
+                'cost': total_cost,
+            })
+        summary = pd.DataFrame(rows, columns=['vehicle', 'passengers', 'distance_km', 'cost'])
+        return (summary.groupby('vehicle', sort=False)
+                .agg(vehicles=('passengers', 'size'), passengers=('passengers', 'sum'),
+                     distance_km=('distance_km', 'sum'), cost=('cost', 'sum'))
+                .reset_index())
+
+    def map_mode(self, staff_count, mode='auto'):
+        """Rendering mode for a map showing ``staff_count`` assigned staff"""
+        if mode != 'auto':
+            return mode
+        if staff_count > self.MAP_LINES_ONLY_THRESHOLD:
+            return 'lines'
+        if staff_count > self.MAP_LIGHT_THRESHOLD:
+            return 'light'
+        return 'detailed'
+
+    @timed('create_map')
+    def create_map(self, routes, staff_data, mode='auto', route_info=None):
+        """Create an interactive map with optimized route visualization
+        
+        ``mode`` is 'detailed' (a marker and popup per staff member), 'light'
+        (one GeoJSON layer each for routes and stops, popups built on click),
+        'lines' (route polylines only) or 'auto' to pick by staff count.
+        ``route_info`` (from ``optimize_multi_depot``) ends each route at its
+        own depot instead of the office.
+        """
+        import folium
+        
+        self.prepare_distances(staff_data)
+        depots = self.depots
+        route_depots = {
+            name: (route_info[name]['depot_index'] if route_info and name in route_info else 0)
+            for name in routes
+        }
+        
+        m = folium.Map(
+            location=[self.office_location['lat'], self.office_location['lon']],
+            zoom_start=13,
+            tiles="cartodbpositron",
+            prefer_canvas=True
+        )
+        
+        # Add office and depot markers
+        for depot in depots:
+            folium.Marker(
+                [depot['lat'], depot['lon']],
+                popup=depot['name'],
+                icon=folium.Icon(color='red', icon='building', prefix='fa'),
+                tooltip=f"{depot['name']} Location"
+            ).add_to(m)
+        
+        mode = self.map_mode(sum(len(route) for route in routes.values()), mode)
+        if mode == 'detailed':
+            self._add_detailed_routes(m, routes, staff_data, route_depots)
+        else:
+            self._add_light_routes(m, routes, staff_data, route_depots,
+                                   draw_stops=(mode == 'light'))
+        
+        folium.LayerControl().add_to(m)
+        return m
+
+    def _add_detailed_routes(self, m, routes, staff_data, route_depots):
+        """One feature group per route with a marker and HTML popup per stop"""
+        import folium
+        
+        depots = self.depots
+        for route_idx, (route_name, route) in enumerate(routes.items()):
+            color = route_color(route_idx)
+            route_group = folium.FeatureGroup(name=route_name)
+            depot = route_depots[route_name]
+            
+            # Create coordinates list for the route
+            group = self.route_details(staff_data, route, depot, distances=self.distances)
+            coordinates = group[['latitude', 'longitude']].values.tolist()
+            coordinates.append([depots[depot]['lat'], depots[depot]['lon']])
+            
+            # Calculate route metrics
+            total_distance, total_cost = self.calculate_route_metrics(route, depot)
+            
+            # Add route line
+            folium.PolyLine(
+                coordinates,
+                weight=2,
+                color=color,
+                opacity=0.8,
+                dash_array='5, 10',
+                popup=f"""
+                <b>{route_name}</b><br>
+                Passengers: {len(group)}<br>
+                Distance: {total_distance:.2f} km<br>
+                Cost: ${total_cost:.2f}
+                """
+            ).add_to(route_group)
+            
+            # Add staff markers
+            for idx, staff in enumerate(group.to_dict('records'), 1):
+                folium.CircleMarker(
+                    [staff['latitude'], staff['longitude']],
+                    radius=6,
+                    popup=f"""
+                    <b>{staff['name']}</b><br>
+                    Address: {staff['address']}<br>
+                    Stop #{idx}<br>
+                    Distance to office: {staff['distance_to_office']:.2f} km
+                    """,
+                    color=color,
+                    fill=True,
+                    fill_opacity=0.7,
+                    tooltip=f"Stop #{idx}: {staff['name']}"
+                ).add_to(route_group)
+            
+            route_group.add_to(m)
+
+    def _add_light_routes(self, m, routes, staff_data, route_depots, draw_stops=True):
+        """Routes (and optionally stops) as single GeoJSON layers with lazy popups"""
+        import folium
+        
+        lats = staff_data['latitude'].to_numpy()
+        lons = staff_data['longitude'].to_numpy()
+        depots = self.depots
+        ends = {name: depots[route_depots[name]] for name in routes}
+        metrics = {name: self.calculate_route_metrics(route, route_depots[name])
+                   for name, route in routes.items()}
+        
+        folium.GeoJson(
+            route_features(routes, lats, lons, ends, metrics),
+            name="Routes",
+            style_function=feature_style,
+            popup=folium.GeoJsonPopup(
+                fields=['route', 'passengers', 'distance_km', 'cost'],
+                aliases=['Route', 'Passengers', 'Distance (km)', 'Cost ($)']
+            )
+        ).add_to(m)
+        
+        if draw_stops:
+            # Each stop's distance to the depot its route ends at
+            to_depot = self.distances.to_office.copy()
+            for name, route in routes.items():
+                to_depot[route] = self.distances.to_depots[route, route_depots[name]]
+            folium.GeoJson(
+                stop_features(
+                    routes, lats, lons,
+                    staff_data['name'].to_numpy(), staff_data['address'].to_numpy(),
+                    to_depot
+                ),
+                name="Staff",
+                marker=folium.CircleMarker(radius=4, fill=True),
+                style_function=feature_style,
+                popup=folium.GeoJsonPopup(
+                    fields=['name', 'address', 'route', 'stop', 'distance_to_office'],
+                    aliases=['Name', 'Address', 'Route', 'Stop #', 'Distance to office (km)']
+                )
+            ).add_to(m)
@@ -0,0 +1,51 @@
+"""Fan independent clusters out to a process pool."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Below this many staff the pool start-up costs more than it saves
+PARALLEL_MIN_STAFF = 500
+
+
+def _solve_subset(solver, distances, min_passengers, max_passengers, time_limit):
+    """Worker entry point: solve one cluster shipped as a DistanceMatrix subset"""
+    members = np.arange(distances.size)
+    return solver.solve(distances, members, min_passengers, max_passengers,
+                        time_limit=time_limit)
+
+
+def solve_clusters(solver, distances, clusters, min_passengers, max_passengers,
+                   time_limit=None, max_workers=None):
+    """Solve every cluster in a process pool.
+
+    Results come back as ``(routes, leftover)`` per cluster, in the order of
+    ``clusters`` and in roster positions, so callers can number routes
+    exactly as the serial path does.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    total = sum(len(members) for members in clusters)
+    lanes = min(max_workers, len(clusters))
+
+    subsets, limits = [], []
+    for members in clusters:
+        subsets.append(distances.subset(members))
+        # Clusters run side by side, so each gets its share of every lane
+        limits.append(None if time_limit is None
+                      else min(time_limit, time_limit * lanes * len(members) / total))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        solved = list(pool.map(
+            _solve_subset,
+            [solver] * len(clusters), subsets,
+            [min_passengers] * len(clusters), [max_passengers] * len(clusters),
+            limits,
+            chunksize=max(1, len(clusters) // (4 * max_workers)),
+        ))
+
+    # Map local subset indices back to roster positions
+    return [
+        ([members[route].astype(route.dtype) for route in routes],
+         members[leftover].astype(leftover.dtype))
+        for members, (routes, leftover) in zip(clusters, solved)
+    ]
@@ -0,0 +1,225 @@
+"""Local road-network distances, no routing service required.
+
+A RoadNetwork is a directed graph stored as SciPy CSR adjacency matrices
+(drive length in km and free-flow time in minutes) built from an OSM XML
+extract on disk. On load, OSM ways are split only at junctions and dead ends,
+so chains of shape points collapse into single edges. That contraction
+typically shrinks city extracts several-fold before any query runs.
+Many-to-many queries run one multi-source Dijkstra per block of distinct
+origin nodes. Staff are snapped to the nearest junction of the largest
+strongly connected component, and the straight-line access leg is added at
+both ends.
+
+Build once, then reuse the compact ``.npz`` form::
+
+    network = RoadNetwork.load('accra.osm')
+    network.save('accra-roads.npz')
+"""
+import hashlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from ride_router.distance import EARTH_RADIUS_KM, haversine
+
+# Free-flow speeds in km/h by OSM highway class; *_link roads use their base class
+SPEEDS_KMH = {
+    'motorway': 90, 'trunk': 70, 'primary': 50, 'secondary': 40, 'tertiary': 35,
+    'unclassified': 30, 'residential': 25, 'living_street': 10, 'service': 15,
+    'road': 25,
+}
+LINK_FACTOR = 0.8
+# Speed for the straight-line leg between a staff member and their junction
+ACCESS_SPEED_KMH = 15
+# Origin nodes per Dijkstra call, bounds the (block x nodes) result array
+SOURCE_BLOCK = 64
+
+WEIGHTS = ('length', 'time')
+
+
+class RoadNetwork:
+    """Directed road graph with snapping and many-to-many shortest paths"""
+
+    def __init__(self, lats, lons, length, time):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.length = length.tocsr()
+        self.time = time.tocsr()
+
+        digest = hashlib.sha1()
+        for array in (self.lats, self.lons, self.length.indptr, self.length.indices, self.length.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        self.fingerprint = digest.hexdigest()
+
+        # Snap only to the largest strongly connected component, so every
+        # snapped pair has a finite route
+        _, component = connected_components(self.length, directed=True, connection='strong')
+        largest = np.bincount(component).argmax()
+        self.routable = np.flatnonzero(component == largest)
+        self._tree = None
+
+    @property
+    def node_count(self):
+        return len(self.lats)
+
+    @property
+    def edge_count(self):
+        return self.length.nnz
+
+    @classmethod
+    def load(cls, path):
+        """Load a network from an OSM XML extract or a saved ``.npz``"""
+        if str(path).endswith('.npz'):
+            with np.load(path, allow_pickle=False) as data:
+                shape = (len(data['lats']),) * 2
+                graph = (data['indices'], data['indptr'])
+                return cls(data['lats'], data['lons'],
+                           csr_matrix((data['length'], *graph), shape=shape),
+                           csr_matrix((data['time'], *graph), shape=shape))
+        return cls.from_osm(path)
+
+    def save(self, path):
+        # Both matrices share one sparsity pattern, built together in from_edges
+        np.savez(path, lats=self.lats, lons=self.lons,
+                 indptr=self.length.indptr, indices=self.length.indices,
+                 length=self.length.data, time=self.time.data)
+
+    @classmethod
+    def from_edges(cls, lats, lons, sources, targets, length_km, time_min):
+        """Build from edge arrays, keeping the shortest of any parallel edges"""
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        length_km = np.asarray(length_km, dtype=np.float64)
+        time_min = np.asarray(time_min, dtype=np.float64)
+
+        order = np.lexsort((length_km, targets, sources))
+        sources, targets = sources[order], targets[order]
+        length_km, time_min = length_km[order], time_min[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        # Self loops carry no routing information
+        keep = first & (sources != targets)
+
+        shape = (len(lats), len(lats))
+        length = csr_matrix((length_km[keep], (sources[keep], targets[keep])), shape=shape)
+        time = csr_matrix((time_min[keep], (sources[keep], targets[keep])), shape=shape)
+        length.sort_indices()
+        time.sort_indices()
+        return cls(lats, lons, length, time)
+
+    @classmethod
+    def from_osm(cls, path):
+        """Parse drivable ways from an OSM XML file and contract shape points"""
+        coords = {}
+        ways = []
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag == 'node':
+                coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+                elem.clear()
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+                speed = _speed(tags.get('highway'))
+                if speed is not None:
+                    refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                    ways.append((refs, speed, _oneway(tags)))
+                elem.clear()
+            elif elem.tag == 'relation':
+                elem.clear()
+
+        # Junctions: nodes shared by several ways, plus every way's endpoints
+        uses = {}
+        for refs, _, _ in ways:
+            for ref in refs:
+                uses[ref] = uses.get(ref, 0) + 1
+        keep = {ref for ref, count in uses.items() if count > 1}
+        for refs, _, _ in ways:
+            keep.update((refs[0], refs[-1]))
+        keep = [ref for ref in keep if ref in coords]
+        index = {ref: i for i, ref in enumerate(keep)}
+
+        sources, targets, lengths, times = [], [], [], []
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in coords]
+            if len(refs) < 2:
+                continue
+            lat = np.array([coords[ref][0] for ref in refs])
+            lon = np.array([coords[ref][1] for ref in refs])
+            cumulative = np.concatenate([[0.0], np.cumsum(haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+            stops = [i for i, ref in enumerate(refs) if ref in index]
+            for a, b in zip(stops, stops[1:]):
+                u, v = index[refs[a]], index[refs[b]]
+                km = cumulative[b] - cumulative[a]
+                minutes = km / speed * 60
+                if oneway >= 0:
+                    sources.append(u), targets.append(v), lengths.append(km), times.append(minutes)
+                if oneway <= 0:
+                    sources.append(v), targets.append(u), lengths.append(km), times.append(minutes)
+
+        lats = np.array([coords[ref][0] for ref in keep])
+        lons = np.array([coords[ref][1] for ref in keep])
+        return cls.from_edges(lats, lons, sources, targets, lengths, times)
+
+    def snap(self, lats, lons):
+        """Nearest routable node and straight-line access distance in km"""
+        if self._tree is None:
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(np.radians(np.column_stack(
+                [self.lats[self.routable], self.lons[self.routable]])), metric='haversine')
+        points = np.radians(np.column_stack([np.atleast_1d(lats), np.atleast_1d(lons)]).astype(np.float64))
+        distance, nearest = self._tree.query(points, k=1)
+        return self.routable[nearest[:, 0]], distance[:, 0] * EARTH_RADIUS_KM
+
+    def travel_matrix(self, lats, lons, other_lats=None, other_lons=None, weight='length'):
+        """Shortest drive from every point to every other point.
+
+        ``weight`` is 'length' (km) or 'time' (minutes). Rows are origins and
+        columns destinations; one-way streets make the result asymmetric.
+        """
+        if weight not in WEIGHTS:
+            raise ValueError(f"Unknown weight '{weight}', expected one of {WEIGHTS}")
+        square = other_lats is None
+        if square:
+            other_lats, other_lons = lats, lons
+        graph = self.length if weight == 'length' else self.time
+
+        src_nodes, src_access = self.snap(lats, lons)
+        dst_nodes, dst_access = self.snap(other_lats, other_lons)
+        if weight == 'time':
+            src_access = src_access / ACCESS_SPEED_KMH * 60
+            dst_access = dst_access / ACCESS_SPEED_KMH * 60
+
+        origins, origin_of = np.unique(src_nodes, return_inverse=True)
+        by_origin = np.empty((len(origins), len(dst_nodes)), dtype=np.float64)
+        for start in range(0, len(origins), SOURCE_BLOCK):
+            block = origins[start:start + SOURCE_BLOCK]
+            by_origin[start:start + len(block)] = dijkstra(graph, directed=True, indices=block)[:, dst_nodes]
+
+        out = by_origin[origin_of] + src_access[:, None] + dst_access[None, :]
+        if square:
+            np.fill_diagonal(out, 0.0)
+        return out
+
+
+def _speed(highway):
+    if highway is None:
+        return None
+    if highway.endswith('_link'):
+        base = SPEEDS_KMH.get(highway[:-len('_link')])
+        return None if base is None else base * LINK_FACTOR
+    return SPEEDS_KMH.get(highway)
+
+
+def _oneway(tags):
+    """1 for forward only, -1 for reverse only, 0 for both directions"""
+    value = tags.get('oneway', '').lower()
+    if value in ('yes', 'true', '1'):
+        return 1
+    if value == '-1':
+        return -1
+    if value == 'no':
+        return 0
+    if tags.get('highway') == 'motorway' or tags.get('junction') == 'roundabout':
+        return 1
+    return 0
@@ -0,0 +1,50 @@
+"""Array-backed route construction.
+
+Routes are compact ``int32`` arrays of staff positions (rows of the roster,
+in pickup order). Staff records are only materialized when a route is shown.
+"""
+import numpy as np
+
+ROUTE_DTYPE = np.int32
+
+
+def greedy_cluster_routes(distances, members, min_passengers, max_passengers):
+    """Furthest-first, nearest-neighbour routes over one cluster.
+
+    ``distances`` is the roster's DistanceMatrix and ``members`` the
+    positions of the cluster's staff. Returns ``(routes, leftover)`` where
+    ``routes`` is a list of position arrays and ``leftover`` the positions
+    that could not fill a route of ``min_passengers``.
+    """
+    members = np.asarray(members, dtype=np.intp)
+    to_office = distances.to_office[members]
+    assigned = np.zeros(len(members), dtype=bool)
+    unassigned = len(members)
+    routes = []
+
+    while unassigned >= min_passengers:
+        # Start with the furthest unassigned person from the office
+        start = np.argmax(np.where(assigned, -np.inf, to_office))
+        route = [start]
+        assigned[start] = True
+        unassigned -= 1
+
+        # Add the closest remaining people until the minimum is met
+        while len(route) < max_passengers and unassigned:
+            step = distances.from_point(members[route[-1]], members)
+            step[assigned] = np.inf
+            nearest = np.argmin(step)
+            route.append(nearest)
+            assigned[nearest] = True
+            unassigned -= 1
+            if len(route) >= min_passengers:
+                break
+
+        routes.append(members[route].astype(ROUTE_DTYPE))
+
+    return routes, members[~assigned].astype(ROUTE_DTYPE)
+
+
+def route_names(count, start=1):
+    """Display names for ``count`` consecutive routes"""
+    return [f'Route {i}' for i in range(start, start + count)]
@@ -0,0 +1,220 @@
+"""Disk-backed store of saved optimization sessions.
+
+Layout under ``root``::
+
+    rosters/<content hash>.parquet   staff data, shared by every snapshot of it
+    snapshots/<id>.json              small metadata record, all that listing reads
+    snapshots/<id>.npz               routes as one int32 position array + offsets,
+                                     plus the snapshot's cluster labels and, for
+                                     multi-depot routes, their route info as JSON
+
+Identical rosters are written once. Derived columns such as ``cluster``
+change with every re-optimization, so they are kept with the snapshot
+rather than in the roster file and its hash. Snapshots load lazily: the
+roster and routes are only read when first accessed. Snapshots older than
+``max_age`` seconds are evicted, then the oldest ones until the store fits
+``max_bytes``.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ride_router.routing import ROUTE_DTYPE
+
+ORPHAN_GRACE_SECONDS = 60
+# Columns the optimizer adds to a roster; stored per snapshot, not per roster
+DERIVED_COLUMNS = ('cluster',)
+
+
+def roster_content_hash(staff_data):
+    """Hash of every column and value of a roster, independent of its index"""
+    digest = hashlib.sha1('\x1f'.join(map(str, staff_data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(staff_data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """A saved session whose roster and routes are read on first access"""
+
+    def __init__(self, store, info):
+        self._store = store
+        self.info = info
+        self._staff_data = None
+        self._routes = None
+        self._clusters = None
+        self._route_info = None
+
+    @property
+    def id(self):
+        return self.info['id']
+
+    @property
+    def staff_data(self):
+        if self._staff_data is None:
+            staff_data = pd.read_parquet(self._store._roster_path(self.info['roster']))
+            self._load_arrays()
+            if self._clusters is not None:
+                staff_data['cluster'] = self._clusters
+            self._staff_data = staff_data
+        return self._staff_data
+
+    @property
+    def routes(self):
+        self._load_arrays()
+        return self._routes
+
+    @property
+    def route_info(self):
+        """Depot, shift and pickup times per route, or None for single-office routes"""
+        self._load_arrays()
+        return self._route_info
+
+    def _load_arrays(self):
+        if self._routes is not None:
+            return
+        with np.load(self._store._snapshot_path(self.id, '.npz'), allow_pickle=False) as data:
+            positions, offsets = data['positions'], data['offsets']
+            # Snapshots saved before clusters moved out of the roster file have none
+            self._clusters = data['clusters'] if 'clusters' in data else None
+            if 'route_info' in data:
+                self._route_info = json.loads(str(data['route_info']))
+        self._routes = {
+            name: positions[offsets[i]:offsets[i + 1]]
+            for i, name in enumerate(self.info['route_names'])
+        }
+
+
+class SessionStore:
+    """Saved sessions on disk, deduplicated by roster and bounded in size and age"""
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'rosters'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'snapshots'), exist_ok=True)
+
+    def save(self, staff_data, routes, label=None, route_info=None):
+        """Write a snapshot and return its metadata record"""
+        created = datetime.now()
+        snapshot_id = f"{created:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        base = staff_data.drop(columns=[c for c in DERIVED_COLUMNS if c in staff_data.columns])
+        roster = roster_content_hash(base)
+
+        roster_path = self._roster_path(roster)
+        if not os.path.exists(roster_path):
+            self._atomic_write(roster_path, lambda f: base.to_parquet(f, index=False))
+
+        route_list = [np.asarray(route, dtype=ROUTE_DTYPE) for route in routes.values()]
+        offsets = np.zeros(len(route_list) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(route) for route in route_list])
+        positions = np.concatenate(route_list) if route_list else np.empty(0, dtype=ROUTE_DTYPE)
+        arrays = {'positions': positions, 'offsets': offsets}
+        if 'cluster' in staff_data.columns:
+            arrays['clusters'] = staff_data['cluster'].to_numpy()
+        if route_info is not None:
+            arrays['route_info'] = np.array(json.dumps(route_info))
+        self._atomic_write(self._snapshot_path(snapshot_id, '.npz'),
+                           lambda f: np.savez(f, **arrays))
+
+        info = {
+            'id': snapshot_id,
+            'created': created.strftime("%Y-%m-%d %H:%M:%S"),
+            'label': label,
+            'roster': roster,
+            'staff_count': len(staff_data),
+            'route_names': list(routes),
+        }
+        self._atomic_write(self._snapshot_path(snapshot_id, '.json'),
+                           lambda f: f.write(json.dumps(info).encode()))
+        self.evict()
+        return info
+
+    def list(self):
+        """Metadata of every snapshot, newest first"""
+        infos = []
+        directory = os.path.join(self.root, 'snapshots')
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    infos.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(infos, key=lambda info: info['id'], reverse=True)
+
+    def load(self, snapshot_id):
+        with open(self._snapshot_path(snapshot_id, '.json')) as f:
+            return Snapshot(self, json.load(f))
+
+    def delete(self, snapshot_id):
+        for ext in ('.json', '.npz'):
+            try:
+                os.remove(self._snapshot_path(snapshot_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, now=None):
+        """Drop expired snapshots, then the oldest until under max_bytes"""
+        now = now if now is not None else datetime.now().timestamp()
+        with self._lock:
+            infos = self.list()
+            if self.max_age is not None:
+                for info in list(infos):
+                    created = datetime.strptime(info['created'], "%Y-%m-%d %H:%M:%S").timestamp()
+                    if now - created > self.max_age:
+                        self.delete(info['id'])
+                        infos.remove(info)
+            self._remove_orphan_rosters(infos)
+
+            while infos and self.size() > self.max_bytes:
+                self.delete(infos.pop()['id'])
+                self._remove_orphan_rosters(infos)
+
+    def size(self):
+        """Total bytes on disk"""
+        total = 0
+        for directory in ('rosters', 'snapshots'):
+            path = os.path.join(self.root, directory)
+            for name in os.listdir(path):
+                try:
+                    total += os.path.getsize(os.path.join(path, name))
+                except OSError:
+                    continue
+        return total
+
+    def _remove_orphan_rosters(self, infos):
+        referenced = {info['roster'] for info in infos}
+        directory = os.path.join(self.root, 'rosters')
+        cutoff = datetime.now().timestamp() - ORPHAN_GRACE_SECONDS
+        for name in os.listdir(directory):
+            if not name.endswith('.parquet') or name[:-len('.parquet')] in referenced:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                # Another process may be between writing a roster and its snapshot
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _roster_path(self, roster):
+        return os.path.join(self.root, 'rosters', f'{roster}.parquet')
+
+    def _snapshot_path(self, snapshot_id, ext):
+        return os.path.join(self.root, 'snapshots', f'{snapshot_id}{ext}')
+
+    @staticmethod
+    def _atomic_write(path, write):
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
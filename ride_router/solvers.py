@@ -0,0 +1,284 @@
+"""Pluggable per-cluster route solvers.
+
+A solver turns the staff positions of one cluster into routes: arrays of
+positions in pickup order, each ending at the office. Solvers read distances
+from the roster's DistanceMatrix and never touch the DataFrame.
+"""
+import time
+
+import numpy as np
+
+from ride_router.fleet import DEFAULT_FLEET, cheapest_vehicle, fleet_capacity
+from ride_router.routing import ROUTE_DTYPE, greedy_cluster_routes
+
+_EPS = 1e-9
+
+
+class RouteSolver:
+    """Base class for per-cluster solvers"""
+
+    name = None
+    time_limit = None  # seconds per optimize_routes call, None for no budget
+
+    def solve(self, distances, members, min_passengers, max_passengers, time_limit=None):
+        """Return ``(routes, leftover)`` position arrays for one cluster"""
+        raise NotImplementedError
+
+
+class GreedySolver(RouteSolver):
+    """Furthest-first, nearest-neighbour routes (the original heuristic)"""
+
+    name = 'greedy'
+
+    def solve(self, distances, members, min_passengers, max_passengers, time_limit=None):
+        return greedy_cluster_routes(distances, members, min_passengers, max_passengers)
+
+
+class SavingsSolver(RouteSolver):
+    """Clarke-Wright savings construction followed by 2-opt/or-opt search.
+
+    Routes are open paths that end at the office, so joining the route that
+    ends at ``i`` to the route that starts at ``j`` saves
+    ``d(i, office) - d(i, j)``. Merges respect ``max_passengers``; routes may
+    end up below ``min_passengers`` when that is cheaper overall. Total cost
+    is ``COST_PER_KM`` times total km, so minimizing km minimizes cost.
+
+    Local search stops at a local optimum or when ``time_limit`` runs out,
+    whichever comes first, and always returns the best solution so far.
+    """
+
+    name = 'savings'
+
+    def __init__(self, time_limit=5.0, neighbours=20, max_segment=3):
+        self.time_limit = time_limit
+        self.neighbours = neighbours
+        self.max_segment = max_segment
+
+    def solve(self, distances, members, min_passengers, max_passengers, time_limit=None):
+        members = np.asarray(members, dtype=np.intp)
+        if len(members) == 0:
+            return [], np.empty(0, dtype=ROUTE_DTYPE)
+
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        problem = _Problem(distances.between(members, members),
+                           distances.to_office[members], self.neighbours)
+        routes = problem.savings(max_passengers)
+        problem.improve(routes, max_passengers, self.max_segment, deadline)
+        return ([members[route].astype(ROUTE_DTYPE) for route in routes],
+                np.empty(0, dtype=ROUTE_DTYPE))
+
+
+class FleetSolver(RouteSolver):
+    """Savings construction priced on a mixed fleet, then 2-opt per route.
+
+    Every route is costed on the cheapest vehicle type that seats it (see
+    ``ride_router.fleet``). Two routes are merged when running one larger
+    vehicle over the joined path costs less than running both, so fixed
+    costs pull passengers onto minibuses where that pays off. Capacity is the
+    largest vehicle's, ``max_passengers`` only caps it further.
+    """
+
+    name = 'fleet'
+
+    def __init__(self, fleet=DEFAULT_FLEET, time_limit=5.0, neighbours=20):
+        self.fleet = tuple(fleet)
+        self.time_limit = time_limit
+        self.neighbours = neighbours
+
+    def solve(self, distances, members, min_passengers, max_passengers, time_limit=None):
+        members = np.asarray(members, dtype=np.intp)
+        if len(members) == 0:
+            return [], np.empty(0, dtype=ROUTE_DTYPE)
+
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        capacity = min(max_passengers, fleet_capacity(self.fleet))
+        problem = _Problem(distances.between(members, members),
+                           distances.to_office[members], self.neighbours)
+        routes = problem.fleet_savings(self.fleet, capacity)
+        for route in routes:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            problem._two_opt(route)
+        return ([members[route].astype(ROUTE_DTYPE) for route in routes],
+                np.empty(0, dtype=ROUTE_DTYPE))
+
+
+class _Problem:
+    """One cluster in local indices: ``dist`` (k x k) and ``to_office`` (k,)"""
+
+    def __init__(self, dist, to_office, neighbours):
+        self.dist = dist
+        self.to_office = to_office
+        self.size = len(to_office)
+        k = min(neighbours, self.size - 1)
+        if k > 0:
+            masked = dist + np.diag(np.full(self.size, np.inf))
+            self.knn = np.argpartition(masked, k - 1, axis=1)[:, :k]
+        else:
+            self.knn = np.empty((self.size, 0), dtype=np.intp)
+
+    def cost(self, route):
+        if not route:
+            return 0.0
+        dist = self.dist
+        total = self.to_office[route[-1]]
+        for a, b in zip(route, route[1:]):
+            total += dist[a, b]
+        return float(total)
+
+    def savings(self, max_passengers):
+        """Clarke-Wright merges over nearest-neighbour candidate pairs"""
+        tails = np.repeat(np.arange(self.size), self.knn.shape[1])
+        heads = self.knn.ravel()
+        saving = self.to_office[tails] - self.dist[tails, heads]
+        keep = saving > _EPS
+        tails, heads, saving = tails[keep], heads[keep], saving[keep]
+        order = np.argsort(-saving, kind='stable')
+
+        routes = {i: [i] for i in range(self.size)}
+        route_of = np.arange(self.size)
+        for i, j in zip(tails[order], heads[order]):
+            a, b = route_of[i], route_of[j]
+            if a == b:
+                continue
+            first, second = routes[a], routes[b]
+            if first[-1] != i or second[0] != j:
+                continue
+            if len(first) + len(second) > max_passengers:
+                continue
+            first.extend(second)
+            route_of[second] = a
+            del routes[b]
+        return list(routes.values())
+
+    def fleet_savings(self, fleet, capacity):
+        """Savings merges accepted only when they lower the fleet cost"""
+        tails = np.repeat(np.arange(self.size), self.knn.shape[1])
+        heads = self.knn.ravel()
+        saving = self.to_office[tails] - self.dist[tails, heads]
+        order = np.argsort(-saving, kind='stable')
+
+        routes = {i: [i] for i in range(self.size)}
+        km = {i: float(self.to_office[i]) for i in range(self.size)}
+        cost = {i: cheapest_vehicle(fleet, 1, km[i])[1] for i in range(self.size)}
+        route_of = np.arange(self.size)
+        for i, j in zip(tails[order], heads[order]):
+            a, b = route_of[i], route_of[j]
+            if a == b:
+                continue
+            first, second = routes[a], routes[b]
+            if first[-1] != i or second[0] != j:
+                continue
+            passengers = len(first) + len(second)
+            if passengers > capacity:
+                continue
+            merged_km = km[a] + km[b] - self.to_office[i] + self.dist[i, j]
+            merged_cost = cheapest_vehicle(fleet, passengers, merged_km)[1]
+            if merged_cost >= cost[a] + cost[b] - _EPS:
+                continue
+            first.extend(second)
+            route_of[second] = a
+            km[a], cost[a] = merged_km, merged_cost
+            del routes[b], km[b], cost[b]
+        return list(routes.values())
+
+    def improve(self, routes, max_passengers, max_segment, deadline):
+        """Alternate 2-opt and or-opt passes until no move helps or time runs out"""
+        def out_of_time():
+            return deadline is not None and time.perf_counter() >= deadline
+
+        improved = True
+        while improved and not out_of_time():
+            improved = False
+            for route in routes:
+                improved |= self._two_opt(route)
+            if out_of_time():
+                break
+            improved |= self._or_opt(routes, max_passengers, max_segment, out_of_time)
+            routes[:] = [route for route in routes if route]
+
+    def _two_opt(self, route):
+        """Segment reversals inside one route"""
+        improved = False
+        best = self.cost(route)
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(route) - 1):
+                for j in range(i + 1, len(route)):
+                    candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                    candidate_cost = self.cost(candidate)
+                    if candidate_cost < best - _EPS:
+                        route[:] = candidate
+                        best = candidate_cost
+                        changed = improved = True
+        return improved
+
+    def _or_opt(self, routes, max_passengers, max_segment, out_of_time):
+        """Move chains of up to ``max_segment`` stops to their cheapest position"""
+        route_of = np.empty(self.size, dtype=np.intp)
+        for index, route in enumerate(routes):
+            route_of[route] = index
+
+        improved = False
+        for source_index in range(len(routes)):
+            if out_of_time():
+                break
+            source = routes[source_index]
+            moved = True
+            while moved and source:
+                moved = False
+                source_cost = self.cost(source)
+                for length in range(1, min(max_segment, len(source)) + 1):
+                    for start in range(len(source) - length + 1):
+                        segment = source[start:start + length]
+                        rest = source[:start] + source[start + length:]
+                        gain = source_cost - self.cost(rest)
+
+                        targets = {route_of[n] for n in self.knn[segment].ravel()}
+                        targets.add(source_index)
+                        best = None
+                        for target_index in targets:
+                            if target_index == source_index:
+                                target = rest
+                            else:
+                                target = routes[target_index]
+                                if not target or len(target) + length > max_passengers:
+                                    continue
+                            target_cost = self.cost(target)
+                            for pos in range(len(target) + 1):
+                                for chain in (segment, segment[::-1]):
+                                    new = target[:pos] + chain + target[pos:]
+                                    delta = self.cost(new) - target_cost
+                                    if delta < gain - _EPS and (best is None or delta - gain < best[0]):
+                                        best = (delta - gain, target_index, new)
+
+                        if best is None:
+                            continue
+                        _, target_index, new = best
+                        if target_index == source_index:
+                            source[:] = new
+                        else:
+                            source[:] = rest
+                            routes[target_index][:] = new
+                            route_of[segment] = target_index
+                        moved = improved = True
+                        break
+                    if moved:
+                        break
+        return improved
+
+
+SOLVERS = {
+    GreedySolver.name: GreedySolver,
+    SavingsSolver.name: SavingsSolver,
+    FleetSolver.name: FleetSolver,
+}
+
+
+def get_solver(name, **options):
+    """Instantiate a registered solver by name"""
+    try:
+        return SOLVERS[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown route solver '{name}', expected one of {sorted(SOLVERS)}") from None